@@ -1,22 +1,18 @@
 import os
 import logging
-import requests
 import gzip
-import shutil
-import json
 import argparse
 import traceback
-import psutil
-import multiprocessing as mp
-from toc_metadata_processor import process_and_write_toc_metadata
-from toc_mrf_metadata_processor import process_and_write_toc_mrf_metadata
-from toc_mrf_size_processor import process_and_write_toc_mrf_size_data
 import config
-import tracemalloc
+from table_index import TableIndexWriter, remove_index
+from compressed_output import open_binary_output, sync_output, COMPRESSION_SUFFIXES
+from async_writer import AsyncTableWriter, CsvBatchEncoder
+from record_scanner import open_records, decode_record
+from record_validator import RecordValidator
 import time
 import sys
-from concurrent.futures import ProcessPoolExecutor, as_completed
-import csv
+from contextlib import ExitStack
+from functools import partial
 from urllib.parse import urlparse, parse_qs
 
 logging.basicConfig(
@@ -32,9 +28,19 @@ ANTHEM_FILE_NAME = "anthem_index.json.gz"
 UNZIPPED_FILE_NAME = "anthem_index.json"
 CARRIER_NAME = "anthem"
 BATCH_SIZE = 1000
-MAX_WORKERS = min(32, mp.cpu_count() * 2)
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 2)
 BUFFER_SIZE = 1024 * 1024
 
+TOC_METADATA_FIELDS = ['carrier', 'dh_re_id', 're_name', 'toc_source_url', 'batch',
+                       'toc_file_name', 'toc_file_url', 'toc_or_mrf_file',
+                       'mrf_file_plan_name', 'reporting_structure_index', 'remarks']
+TOC_MRF_METADATA_FIELDS = ['reporting_entity_name', 'reporting_entity_type', 'reporting_structure',
+                           'in_network_file_name', 'in_network_file_location', 'in_network_file_description',
+                           'allowed_amount_file_name', 'allowed_amount_file_location', 'allowed_amount_file_description',
+                           'plan_name', 'plan_id_type', 'plan_id', 'plan_market_type', 'toc_source_file_name',
+                           'parsed_date', 'carrier', 'batch']
+TOC_MRF_SIZE_FIELDS = ['in_network_file_name', 'in_network_file_size', 'remarks', 'carrier', 'batch']
+
 def extract_filename_from_url(url):
     parsed_url = urlparse(url)
     query_params = parse_qs(parsed_url.query)
@@ -107,79 +113,101 @@ def process_json_object(obj, reporting_structure_index):
     
     return metadata_rows, mrf_metadata_rows, mrf_size_rows
 
-def process_anthem_file(file_path):
-    """Process the Anthem file and write directly to CSVs"""
+def process_anthem_file(file_path, compression=config.OUTPUT_COMPRESSION):
+    """Process the Anthem file and write directly to CSVs, optionally compressed"""
+    import psutil
+
     try:
         print("Starting file processing...")
         total_objects = 0
         reporting_structure_index = 0
         
-        # Initialize CSV writers
-        with open(config.TOC_METADATA_CSV, 'w', newline='') as f1, \
-             open(config.TOC_MRF_METADATA_CSV, 'w', newline='') as f2, \
-             open(config.TOC_MRF_SIZE_DATA_CSV, 'w', newline='') as f3:
+        # Rows are encoded on this thread and written by one writer thread per table
+        output_files = [config.TOC_METADATA_CSV, config.TOC_MRF_METADATA_CSV, config.TOC_MRF_SIZE_DATA_CSV]
+        # The query index is built as rows are encoded; row offsets are only meaningful in uncompressed output
+        index_writer = None
+        if config.BUILD_TABLE_INDEX and not compression:
+            index_writer = TableIndexWriter(config.TOC_MRF_METADATA_CSV, TOC_MRF_METADATA_FIELDS)
+        encoders = [CsvBatchEncoder(TOC_METADATA_FIELDS), CsvBatchEncoder(TOC_MRF_METADATA_FIELDS, index_writer),
+                    CsvBatchEncoder(TOC_MRF_SIZE_FIELDS)]
+        next_checkpoint = config.WRITER_CHECKPOINT_OBJECTS
+        
+        # Indexes of a previous uncompressed table would point into the new one
+        if not compression:
+            remove_index(config.TOC_MRF_METADATA_CSV)
+        with ExitStack() as stack:
+            writers = []
+            for output_file in output_files:
+                sink = stack.enter_context(open_binary_output(output_file, compression))
+                writers.append(stack.enter_context(
+                    AsyncTableWriter(sink.write, partial(sync_output, sink), name=f"writer-{output_file}")))
             
             # Write headers
-            writer1 = csv.DictWriter(f1, fieldnames=['carrier', 'dh_re_id', 're_name', 'toc_source_url', 'batch', 
-                                                    'toc_file_name', 'toc_file_url', 'toc_or_mrf_file', 
-                                                    'mrf_file_plan_name', 'reporting_structure_index', 'remarks'])
-            writer2 = csv.DictWriter(f2, fieldnames=['reporting_entity_name', 'reporting_entity_type', 'reporting_structure',
-                                                    'in_network_file_name', 'in_network_file_location', 'in_network_file_description',
-                                                    'allowed_amount_file_name', 'allowed_amount_file_location', 'allowed_amount_file_description',
-                                                    'plan_name', 'plan_id_type', 'plan_id', 'plan_market_type', 'toc_source_file_name',
-                                                    'parsed_date', 'carrier', 'batch'])
-            writer3 = csv.DictWriter(f3, fieldnames=['in_network_file_name', 'in_network_file_size', 'remarks', 'carrier', 'batch'])
-            
-            writer1.writeheader()
-            writer2.writeheader()
-            writer3.writeheader()
+            for encoder in encoders:
+                encoder.writeheader()
             
             # Process file
-            with open(file_path, 'r') as f:
-                # Skip the initial [
-                f.readline()
-                
-                while True:
-                    batch = []
-                    for _ in range(BATCH_SIZE):
-                        line = f.readline().strip()
-                        if not line or line == ']':
-                            break
-                        if line.endswith(','):
-                            line = line[:-1]
-                        batch.append(line)
-                    
-                    if not batch:
-                        break
+            file_size = os.path.getsize(file_path)
+            records_in_batch = 0
+            validator = stack.enter_context(RecordValidator())
+            with open_records(file_path) as scanner:
+                for record in scanner:
+                    try:
+                        obj = decode_record(record)
+                    except ValueError as e:
+                        # JSONDecodeError, or UnicodeDecodeError for invalid UTF-8 with the stdlib decoder
+                        logger.error(f"JSON decode error: {str(e)}")
+                        validator.record_error('json_decode', str(e), record, scanner.record_start)
+                        obj = None
                     
-                    # Process batch
-                    for line in batch:
+                    if obj is not None and validator.validate(obj, record, scanner.record_start):
                         try:
-                            obj = json.loads(line)
                             reporting_structure_index += 1
-                            metadata_rows, mrf_metadata_rows, mrf_size_rows = process_json_object(obj, reporting_structure_index)
+                            rows = process_json_object(obj, reporting_structure_index)
                             
-                            # Write to CSVs
-                            writer1.writerows(metadata_rows)
-                            writer2.writerows(mrf_metadata_rows)
-                            writer3.writerows(mrf_size_rows)
+                            for encoder, table_rows in zip(encoders, rows):
+                                encoder.writerows(table_rows)
                             
                             total_objects += 1
                             
                             if total_objects % 100 == 0:
-                                progress = (f.tell() / os.path.getsize(file_path)) * 100
+                                progress = (scanner.position / file_size) * 100
                                 print(f"\rProgress: {progress:.2f}% | Objects: {total_objects:,} | Memory: {psutil.Process().memory_info().rss/1024/1024:.0f}MB", end='')
                                 sys.stdout.flush()
                                 
-                        except json.JSONDecodeError as e:
-                            logger.error(f"JSON decode error: {str(e)}")
-                            continue
                         except Exception as e:
                             logger.error(f"Error processing object: {str(e)}")
-                            continue
+                            validator.record_error('processing_error', str(e), record, scanner.record_start)
+                    
+                    records_in_batch += 1
+                    if records_in_batch < BATCH_SIZE:
+                        continue
+                    records_in_batch = 0
+                    
+                    # Hand the encoded batch to the writer threads
+                    for encoder, writer in zip(encoders, writers):
+                        writer.put(encoder.take())
+                    
+                    if next_checkpoint and total_objects >= next_checkpoint:
+                        for writer in writers:
+                            writer.checkpoint()
+                        next_checkpoint += config.WRITER_CHECKPOINT_OBJECTS
+            
+            # Rows from the last partial batch
+            for encoder, writer in zip(encoders, writers):
+                writer.put(encoder.take())
+        
+        if index_writer:
+            index_writer.finalize()
         
         print(f"\nProcessing completed successfully")
         print(f"Total objects processed: {total_objects:,}")
+        summary = validator.summary()
+        print(f"Records rejected: {summary['records_rejected']:,} | Sampled for schema check: {summary['records_sampled']:,}")
+        for error_class, count in summary['error_counts'].items():
+            print(f"  {error_class}: {count:,}")
+        if summary['records_quarantined']:
+            print(f"Quarantined records written to {config.QUARANTINE_FILE}")
         return True
     except Exception as e:
         logger.error(f"Error processing file {file_path}: {str(e)}")
@@ -189,6 +217,8 @@ def process_anthem_file(file_path):
 
 def download_anthem_file():
     """Download the Anthem index file"""
+    import requests
+
     os.makedirs(DOWNLOAD_DIR, exist_ok=True)
     file_path = os.path.join(DOWNLOAD_DIR, ANTHEM_FILE_NAME)
     
@@ -243,11 +273,15 @@ def main():
     parser = argparse.ArgumentParser(description="Process Anthem index file")
     parser.add_argument("--process-only", action="store_true", help="Process existing file without downloading")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument("--compression", choices=sorted(COMPRESSION_SUFFIXES), default=config.OUTPUT_COMPRESSION,
+                        help="Write compressed CSVs using parallel block compression")
     args = parser.parse_args()
 
     if args.debug:
         logging.getLogger().setLevel(logging.DEBUG)
 
+    import tracemalloc
+
     try:
         tracemalloc.start()
         start_time = time.time()
@@ -256,7 +290,7 @@ def main():
             unzipped_file = os.path.join(DOWNLOAD_DIR, UNZIPPED_FILE_NAME)
             if os.path.exists(unzipped_file):
                 print(f"Processing existing file: {unzipped_file}")
-                success = process_anthem_file(unzipped_file)
+                success = process_anthem_file(unzipped_file, args.compression)
             else:
                 print(f"File not found: {unzipped_file}")
                 success = False
@@ -267,7 +301,7 @@ def main():
                 print("Unzipping file...")
                 unzipped_file = unzip_file(downloaded_file)
                 if unzipped_file:
-                    success = process_anthem_file(unzipped_file)
+                    success = process_anthem_file(unzipped_file, args.compression)
                 else:
                     success = False
             else:
@@ -0,0 +1,168 @@
+import io
+import csv
+import queue
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class _Checkpoint:
+    def __init__(self):
+        self.done = threading.Event()
+
+class AsyncTableWriter:
+    """
+    Write encoded batches for one output table on a dedicated thread.
+
+    The producer hands over already encoded bytes through a bounded queue and
+    goes back to parsing. The writer thread coalesces whatever is queued, up to
+    coalesce_bytes, into one sequential write. flush_fn (typically flush plus
+    fsync) only runs at checkpoints and on close.
+    """
+
+    def __init__(self, write_fn: Callable[[bytes], object], flush_fn: Optional[Callable[[], object]] = None,
+                 max_pending: int = config.WRITER_QUEUE_SIZE,
+                 coalesce_bytes: int = config.WRITER_COALESCE_BYTES, name: str = 'table-writer'):
+        self.write_fn = write_fn
+        self.flush_fn = flush_fn
+        self.coalesce_bytes = coalesce_bytes
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error: Optional[BaseException] = None
+        self.bytes_written = 0
+        self.writes = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise RuntimeError(f"Writer thread {self.thread.name} failed: {self.error}") from self.error
+
+    def put(self, data: bytes):
+        """Queue an encoded batch, blocking while the queue is full"""
+        self._raise_error()
+        if data:
+            self.queue.put(data)
+
+    def _write(self, chunks):
+        if not chunks or self.error is not None:
+            return
+        try:
+            data = b''.join(chunks) if len(chunks) > 1 else chunks[0]
+            self.write_fn(data)
+            self.bytes_written += len(data)
+            self.writes += 1
+        except BaseException as e:
+            # Keep draining so producers blocked on put() are released
+            logger.error(f"Writer thread {self.thread.name} failed: {str(e)}")
+            self.error = e
+
+    def _flush(self):
+        if self.flush_fn and self.error is None:
+            try:
+                self.flush_fn()
+            except BaseException as e:
+                logger.error(f"Writer thread {self.thread.name} failed to flush: {str(e)}")
+                self.error = e
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            chunks = []
+            size = 0
+            while isinstance(item, bytes):
+                chunks.append(item)
+                size += len(item)
+                if size >= self.coalesce_bytes:
+                    item = None
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    item = None
+                    break
+            self._write(chunks)
+
+            if isinstance(item, _Checkpoint):
+                self._flush()
+                item.done.set()
+            elif item is _STOP:
+                self._flush()
+                return
+
+    def checkpoint(self):
+        """Block until everything queued so far is written and flushed"""
+        self._raise_error()
+        marker = _Checkpoint()
+        self.queue.put(marker)
+        marker.done.wait()
+        self._raise_error()
+
+    def close(self):
+        """Write everything still queued, flush and stop the writer thread"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(_STOP)
+        self.thread.join()
+        logger.info(f"Writer thread {self.thread.name} wrote {self.bytes_written} bytes in {self.writes} writes")
+        self._raise_error()
+
+class CsvBatchEncoder:
+    """
+    Encode CSV rows into an in-memory buffer whose bytes are handed to an AsyncTableWriter.
+
+    With an index_writer, rows are encoded one at a time so that each row's byte
+    offset in the output is known and passed to index_writer.add(); this relies
+    on every take() result being written, in order, to an uncompressed file.
+    """
+
+    def __init__(self, fieldnames: List[str], index_writer=None):
+        self.buffer = io.StringIO()
+        self.writer = csv.DictWriter(self.buffer, fieldnames=fieldnames)
+        self.index_writer = index_writer
+        self.encoded: List[bytes] = []
+        self.offset = 0
+
+    def writeheader(self):
+        self.writer.writeheader()
+        if self.index_writer is not None:
+            self._encode_buffer()
+
+    def writerows(self, rows: List[Dict]):
+        if self.index_writer is None:
+            self.writer.writerows(rows)
+            return
+        for row in rows:
+            self.writer.writerow(row)
+            self.index_writer.add(row, self.offset)
+            self._encode_buffer()
+
+    def _encode_buffer(self):
+        data = self._take_buffer()
+        self.encoded.append(data)
+        self.offset += len(data)
+
+    def _take_buffer(self) -> bytes:
+        data = self.buffer.getvalue().encode()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def take(self) -> bytes:
+        """Return the encoded rows written since the last call and reset the buffer"""
+        if self.index_writer is None:
+            return self._take_buffer()
+        data = b''.join(self.encoded)
+        self.encoded = []
+        return data
@@ -0,0 +1,160 @@
+import io
+import os
+import gzip
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import config
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+def _block_compressor(codec: str, level: int):
+    if codec == 'gzip':
+        # mtime=0 keeps the output reproducible across runs
+        return lambda block: gzip.compress(block, compresslevel=level, mtime=0)
+    if codec == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd output requires the zstandard package (pip install zstandard)")
+        # ZstdCompressor objects are not thread-safe, so each block gets its own
+        return lambda block: zstandard.ZstdCompressor(level=level).compress(block)
+    raise ValueError(f"Unsupported compression codec: {codec}")
+
+class ParallelCompressedWriter(io.RawIOBase):
+    """
+    Binary sink that compresses fixed-size blocks on a thread pool, pigz-style.
+
+    Each block becomes an independent gzip member or zstd frame, and the frames
+    are written in order. Concatenated members/frames are valid gzip/zstd streams,
+    so zcat, zstdcat, gzip.open and pandas read the output unchanged. zlib and
+    zstd release the GIL while compressing, so the blocks compress in parallel.
+    """
+
+    def __init__(self, file_path: str, codec: str = 'gzip', level: int = config.OUTPUT_COMPRESSION_LEVEL,
+                 block_size: int = config.OUTPUT_COMPRESSION_BLOCK_SIZE,
+                 threads: int = config.OUTPUT_COMPRESSION_THREADS):
+        super().__init__()
+        self.compress = _block_compressor(codec, level)
+        self.block_size = block_size
+        self.max_pending = threads * 2
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.file = open(file_path, 'wb')
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def writable(self):
+        return True
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.bytes_in += len(data)
+        while len(self.buffer) >= self.block_size:
+            self._submit(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def _submit(self, block: bytes):
+        self.pending.append(self.executor.submit(self.compress, block))
+        # Bound the number of blocks in flight so memory stays at a few blocks per thread
+        while len(self.pending) > self.max_pending:
+            self._write_next()
+
+    def _write_next(self):
+        frame = self.pending.popleft().result()
+        self.file.write(frame)
+        self.bytes_out += len(frame)
+
+    def flush(self):
+        if self.closed:
+            return
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer.clear()
+        while self.pending:
+            self._write_next()
+        self.file.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            self.executor.shutdown()
+            self.file.close()
+
+def output_path(file_path: str, compression: str = config.OUTPUT_COMPRESSION) -> str:
+    """Return the output file name with the suffix for the configured compression"""
+    if not compression:
+        return file_path
+    return file_path + COMPRESSION_SUFFIXES[compression]
+
+def open_binary_output(file_path: str, compression: str = config.OUTPUT_COMPRESSION):
+    """Open a binary output file for already encoded data, compressed if configured"""
+    if not compression:
+        return open(file_path, 'wb')
+    return ParallelCompressedWriter(output_path(file_path, compression), compression)
+
+def sync_output(f):
+    """Flush an output file and fsync it to disk"""
+    f.flush()
+    os.fsync(f.fileno())
+
+def benchmark(sample_file: str = None, total_mb: int = 256):
+    """Compare write throughput of plain, single-threaded gzip and parallel compressed output"""
+    if sample_file:
+        with open(sample_file, 'rb') as f:
+            sample = f.read(16 * 1024 * 1024)
+    else:
+        row = ('United-HealthCare-Services-Inc,Third-Party-Administrator,group,'
+               '2024-10-01_United-HealthCare-Services--Inc-_Third-Party-Administrator_OHPH-ST_30_in-network-rates.json.gz,'
+               'https://transparency-in-coverage.uhc.com/api/v1/uhc/blobs/download?fd=2024-10-01&fn=2024-10-01_'
+               'United-HealthCare-Services--Inc-_Third-Party-Administrator_OHPH-ST_30_in-network-rates.json.gz,'
+               'in-network file,,,,A-1 PUMP INC,EIN,{},group,index.json,2024-10-19,uhc,2024-10\n')
+        sample = ''.join(row.format(830000000 + i) for i in range(20000)).encode()
+    repeats = max(1, (total_mb * 1024 * 1024) // len(sample))
+    total_bytes = repeats * len(sample)
+
+    sinks = [
+        ('plain', 'bench.csv', lambda path: open(path, 'wb')),
+        ('gzip (1 thread)', 'bench.csv.gz', lambda path: gzip.open(path, 'wb', compresslevel=config.OUTPUT_COMPRESSION_LEVEL)),
+        (f'gzip ({config.OUTPUT_COMPRESSION_THREADS} threads)', 'bench.par.csv.gz',
+         lambda path: ParallelCompressedWriter(path, 'gzip')),
+    ]
+    try:
+        _block_compressor('zstd', config.OUTPUT_COMPRESSION_LEVEL)
+        sinks.append((f'zstd ({config.OUTPUT_COMPRESSION_THREADS} threads)', 'bench.csv.zst',
+                      lambda path: ParallelCompressedWriter(path, 'zstd')))
+    except ValueError:
+        print("zstandard not installed, skipping zstd")
+
+    for name, path, open_sink in sinks:
+        start_time = time.time()
+        sink = open_sink(path)
+        for _ in range(repeats):
+            sink.write(sample)
+        sink.close()
+        elapsed = time.time() - start_time
+        size = os.path.getsize(path)
+        print(f"{name:<20} {total_bytes / elapsed / 1024 / 1024:8.1f} MB/s | ratio {total_bytes / size:6.1f}x")
+        os.remove(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed CSV output")
+    parser.add_argument("--sample-file", help="CSV file to use as benchmark input (defaults to synthetic rows)")
+    parser.add_argument("--total-mb", type=int, default=256, help="Amount of data to write per sink")
+    args = parser.parse_args()
+    benchmark(args.sample_file, args.total_mb)
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@ NUM_FILES_TO_PROCESS = 5
 # Download directory
 DOWNLOAD_DIR = "downloads"
 
+# Directory for in_network items parsed from downloaded MRFs (JSON lines)
+PARSED_DIR = "parsed"
+
 # Output CSV file names
 TOC_METADATA_CSV = "toc_metadata.csv"
 TOC_MRF_METADATA_CSV = "toc_mrf_metadata.csv"
@@ -31,3 +34,83 @@ MAX_THREADS_FILE_SIZE = 10
 
 # Timeout for file size retrieval requests (in seconds)
 FILE_SIZE_REQUEST_TIMEOUT = 10
+
+# Provider reference index settings
+# SQLite file used to store provider_references during the first streaming pass
+PROVIDER_REF_DB = "provider_references.db"
+
+# Number of provider reference rows inserted per SQLite transaction
+PROVIDER_REF_INSERT_BATCH = 5000
+
+# Memory budget (in MB) shared between the SQLite page cache and the LRU cache
+PROVIDER_REF_MEMORY_LIMIT_MB = 256
+
+# MRF job scheduler settings
+# Assumed per-worker throughput (bytes per second) used to project the makespan
+SCHEDULER_BYTES_PER_SECOND = 50 * 1024 * 1024
+
+# Output CSV mapping every in-network file to the canonical file with the same content
+TOC_MRF_DEDUP_LINKS_CSV = "toc_mrf_dedup_links.csv"
+
+# Query index settings
+# Build plan_id / reporting_entity_name / in_network_file_name indexes while writing toc_mrf_metadata.csv
+BUILD_TABLE_INDEX = True
+
+# Number of rows held in memory before a sorted index run is spilled to disk
+TABLE_INDEX_RUN_SIZE = 1000000
+
+# Record scanner settings
+# Bytes of the Anthem index read per window when orjson is installed; lines are split out of each window in C
+RECORD_SCAN_WINDOW = 4 * 1024 * 1024
+
+# Output compression settings
+# Compression for anthem.py output CSVs: None, "gzip" or "zstd" (zstd requires the zstandard package)
+OUTPUT_COMPRESSION = None
+
+# Compression level passed to gzip/zstd
+OUTPUT_COMPRESSION_LEVEL = 6
+
+# Size of each independently compressed block (in bytes)
+OUTPUT_COMPRESSION_BLOCK_SIZE = 4 * 1024 * 1024
+
+# Number of threads compressing blocks in parallel
+OUTPUT_COMPRESSION_THREADS = 4
+
+# Async writer settings
+# Maximum number of encoded batches queued per output table before the parser blocks
+WRITER_QUEUE_SIZE = 8
+
+# Queued batches are coalesced into sequential writes of up to this many bytes
+WRITER_COALESCE_BYTES = 16 * 1024 * 1024
+
+# Flush and fsync anthem.py output every this many objects (0 to only sync at the end)
+WRITER_CHECKPOINT_OBJECTS = 1000000
+
+# Size probe settings
+# Token bucket rate (requests per second) and burst size per host
+SIZE_PROBE_RATE_PER_HOST = 20
+SIZE_PROBE_BURST_PER_HOST = 20
+
+# AIMD concurrency limit per host: starting value and ceiling
+SIZE_PROBE_INITIAL_CONCURRENCY = 4
+SIZE_PROBE_MAX_CONCURRENCY = 16
+
+# Consecutive failures before a host's circuit opens, and how long it stays open (in seconds)
+SIZE_PROBE_FAILURE_THRESHOLD = 5
+SIZE_PROBE_CIRCUIT_COOLDOWN = 60
+
+# Per-host request timeouts (in seconds) overriding FILE_SIZE_REQUEST_TIMEOUT, e.g. {"example.com": 30}
+SIZE_PROBE_HOST_TIMEOUTS = {}
+
+# Retries for throttled (429/503) probes and the maximum backoff between them (in seconds)
+SIZE_PROBE_MAX_RETRIES = 3
+SIZE_PROBE_MAX_BACKOFF = 30
+
+# Data-quality validation settings
+# Fraction of records that get the full ToC schema check (required keys and types are checked on every record)
+VALIDATION_SAMPLE_RATE = 0.01
+
+# JSON lines file receiving bad records, the maximum number of records kept and bytes kept per record
+QUARANTINE_FILE = "quarantine.jsonl"
+QUARANTINE_MAX_RECORDS = 1000
+QUARANTINE_MAX_RECORD_BYTES = 64 * 1024
@@ -2,31 +2,29 @@ import os
 import json
 import time
 import logging
-import ijson
-from typing import List, Dict, Any, Iterator
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from toc_metadata_processor import process_and_write_toc_metadata
-from toc_mrf_metadata_processor import process_and_write_toc_mrf_metadata
-from toc_mrf_size_processor import process_and_write_toc_mrf_size_data
+from typing import List, Dict, Any, Iterator, TYPE_CHECKING
+from workers import make_process_pool, process_single_file, PARSE_WORKER_PRELOAD
 import config
-from tqdm import tqdm
+
+# Selenium and tqdm are imported where they are used: pool workers re-import
+# this module as __mp_main__, and they need neither
+if TYPE_CHECKING:
+    from selenium import webdriver
 
 # Set up logging
 logging.basicConfig(filename=config.LOG_FILE, level=config.LOG_LEVEL,
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-def setup_chrome_driver() -> webdriver.Chrome:
+def setup_chrome_driver() -> 'webdriver.Chrome':
     """
     Set up and configure the Chrome WebDriver.
 
     Returns:
         webdriver.Chrome: Configured Chrome WebDriver instance.
     """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
     chrome_options = Options()
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
@@ -52,6 +50,11 @@ def download_json_files(url: str, num_files: int = config.NUM_FILES_TO_PROCESS)
     Returns:
         List[str]: List of downloaded file paths.
     """
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from tqdm import tqdm
+
     driver = setup_chrome_driver()
     driver.get(url)
     
@@ -83,23 +86,6 @@ def download_json_files(url: str, num_files: int = config.NUM_FILES_TO_PROCESS)
     
     return downloaded_files
 
-def process_single_file(json_file: str) -> None:
-    """
-    Process a single JSON file and write the extracted data to CSV files.
-
-    Args:
-        json_file (str): Path to the JSON file to process.
-    """
-    logging.info(f"Processing file: {json_file}")
-    try:
-        process_and_write_toc_metadata(json_file, config.TOC_METADATA_CSV)
-        process_and_write_toc_mrf_metadata(json_file, config.TOC_MRF_METADATA_CSV)
-        process_and_write_toc_mrf_size_data(json_file, config.TOC_MRF_SIZE_DATA_CSV)
-    except ijson.JSONError:
-        logging.error(f"Invalid JSON in file: {json_file}")
-    except Exception as e:
-        logging.error(f"Error processing file {json_file}: {str(e)}")
-
 def process_json_files(json_files: List[str]) -> None:
     """
     Process the downloaded JSON files in parallel and generate CSV outputs.
@@ -107,7 +93,10 @@ def process_json_files(json_files: List[str]) -> None:
     Args:
         json_files (List[str]): List of JSON file paths to process.
     """
-    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+    from tqdm import tqdm
+
+    # Workers fork from a forkserver with only the parsing modules loaded
+    with make_process_pool(os.cpu_count(), PARSE_WORKER_PRELOAD) as executor:
         list(tqdm(executor.map(process_single_file, json_files), total=len(json_files), desc="Processing files"))
 
 def main():
@@ -0,0 +1,187 @@
+import os
+import csv
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import config
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+LINK_FIELDS = ['in_network_file_name', 'in_network_file_location', 'canonical_file_name',
+               'canonical_file_location', 'content_key']
+
+def probe_identity(url: str) -> Tuple[Optional[int], Optional[str]]:
+    """Return (size, strong ETag) for a URL from a HEAD request; either may be None"""
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=config.FILE_SIZE_REQUEST_TIMEOUT)
+        size = response.headers.get('Content-Length')
+        etag = response.headers.get('ETag')
+        # Weak ETags only promise semantic equivalence, not identical bytes
+        if etag and etag.startswith('W/'):
+            etag = None
+        return (int(size) if size and size.isdigit() else None), (etag.strip('"') if etag else None)
+    except requests.RequestException as e:
+        logger.warning(f"Identity probe failed for {url}: {str(e)}")
+        return None, None
+
+def hash_file(file_path: str) -> str:
+    """Stream a local file through SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class MrfDeduplicator:
+    """
+    Collapse MRF jobs whose URLs point at identical content.
+
+    Identity is decided cheaply first: a matching size plus strong ETag is taken as
+    the same file and only one copy is downloaded. Files that share a size but
+    have no ETag cannot be told apart without their content, so each of them is
+    downloaded once with verify_hash set; the download job hashes the stream, and
+    resolve_downloads() then drops the duplicate copies before they are parsed.
+    A unique size already proves a unique file.
+    """
+
+    def __init__(self, max_threads: int = config.MAX_THREADS_FILE_SIZE,
+                 bytes_per_second: float = config.SCHEDULER_BYTES_PER_SECOND,
+                 probe=probe_identity):
+        self.max_threads = max_threads
+        self.bytes_per_second = bytes_per_second
+        self.probe = probe
+        self.links: Dict[str, Dict] = {}
+        self.report: Optional[Dict] = None
+
+    def _content_keys(self, jobs: List[Dict]) -> Dict[str, Optional[str]]:
+        """Content key per URL; None for files that have to be hashed after download"""
+        with ThreadPoolExecutor(max_workers=self.max_threads) as executor:
+            identities = list(executor.map(lambda job: self.probe(job['url']), jobs))
+
+        keys = {}
+        hash_candidates = defaultdict(list)
+        for job, (size, etag) in zip(jobs, identities):
+            if size is not None:
+                job['size'] = size
+                job['size_known'] = True
+            if size is not None and etag:
+                keys[job['url']] = f"etag:{size}:{etag}"
+            elif size is not None:
+                hash_candidates[size].append(job)
+            else:
+                keys[job['url']] = f"url:{job['url']}"
+
+        for size, candidates in hash_candidates.items():
+            for job in candidates:
+                keys[job['url']] = f"size:{size}:{job['url']}" if len(candidates) == 1 else None
+        return keys
+
+    def _link(self, job: Dict, canonical: Dict, key: str):
+        self.links[job['url']] = {
+            'in_network_file_name': job['file_name'],
+            'in_network_file_location': job['url'],
+            'canonical_file_name': canonical['file_name'],
+            'canonical_file_location': canonical['url'],
+            'content_key': key,
+        }
+
+    def dedupe(self, jobs: List[Dict]) -> List[Dict]:
+        """Return the jobs to download and record links from every file to its canonical job"""
+        keys = self._content_keys(jobs)
+
+        unique = {}
+        to_download = []
+        bytes_saved = 0
+        for job in jobs:
+            key = keys[job['url']]
+            if key is None:
+                job['verify_hash'] = True
+                to_download.append(job)
+                self._link(job, job, f"size:{job['size']}:unverified")
+                continue
+            canonical = unique.setdefault(key, job)
+            if canonical is job:
+                to_download.append(job)
+            else:
+                bytes_saved += job.get('size', 0)
+            self._link(job, canonical, key)
+
+        duplicates = len(jobs) - len(to_download)
+        self.report = {
+            'files': len(jobs),
+            'unique_files': len(unique) + sum(1 for key in keys.values() if key is None),
+            'duplicates': duplicates,
+            'to_verify': len(to_download) - len(unique),
+            'bytes_saved': bytes_saved,
+            'estimated_download_seconds_saved': bytes_saved / self.bytes_per_second,
+            # Every duplicate is also a parse that does not happen
+            'parses_avoided': duplicates,
+            'bytes_not_parsed': bytes_saved,
+        }
+        logger.info(f"Dedup finished: {self.report}")
+        return to_download
+
+    def resolve_downloads(self, results: List[Dict]) -> List[Dict]:
+        """
+        Collapse downloaded verify_hash files with identical SHA-256 digests.
+
+        Duplicate copies are linked to the first download with the same digest and
+        deleted, so only one copy is parsed. Their download was not avoided, so
+        they are reported separately and not counted in bytes_saved. Returns the
+        results that remain to be parsed.
+        """
+        canonical_by_digest = {}
+        remaining = []
+        duplicate_bytes = 0
+        for result in results:
+            link = self.links.get(result['url'])
+            if link is None or not link['content_key'].endswith(':unverified'):
+                remaining.append(result)
+                continue
+            digest = result.get('sha256') or hash_file(result['file_path'])
+            key = f"sha256:{digest}"
+            canonical = canonical_by_digest.setdefault(key, result)
+            link['content_key'] = key
+            link['canonical_file_name'] = canonical['file_name']
+            link['canonical_file_location'] = canonical['url']
+            if canonical is result:
+                remaining.append(result)
+            else:
+                os.remove(result['file_path'])
+                duplicate_bytes += result.get('bytes', 0)
+
+        duplicates = len(results) - len(remaining)
+        self.report['unique_files'] -= duplicates
+        self.report['duplicates'] += duplicates
+        self.report['duplicates_after_download'] = duplicates
+        self.report['duplicate_bytes_downloaded'] = duplicate_bytes
+        self.report['parses_avoided'] += duplicates
+        self.report['bytes_not_parsed'] += duplicate_bytes
+        logger.info(f"Hash verification finished: {self.report}")
+        return remaining
+
+    def estimate_parse_savings(self, results: List[Dict]) -> Optional[float]:
+        """
+        Estimate the parse CPU time saved from the measured parse throughput.
+
+        results are parse results carrying bytes and parse_seconds; returns None
+        when nothing was parsed.
+        """
+        parsed = [result for result in results if result.get('parse_seconds')]
+        parse_seconds = sum(result['parse_seconds'] for result in parsed)
+        if not parse_seconds:
+            return None
+        bytes_per_second = sum(result['bytes'] for result in parsed) / parse_seconds
+        self.report['estimated_parse_seconds_saved'] = self.report['bytes_not_parsed'] / bytes_per_second
+        return self.report['estimated_parse_seconds_saved']
+
+    def write_links(self, output_file: str):
+        """Write the file-to-canonical-file mapping so results can be joined back to plan rows"""
+        with open(output_file, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=LINK_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.links.values())
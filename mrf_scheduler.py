@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import heapq
+import hashlib
+import logging
+import argparse
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+from concurrent.futures import FIRST_COMPLETED, wait
+import config
+from output_tables import iter_csv_rows
+from workers import make_process_pool
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 1024 * 1024
+
+def load_file_sizes(size_csv: str) -> Dict[str, int]:
+    """Read in_network_file_size per file name from the size table, skipping unknown sizes"""
+    sizes = {}
+    for row in iter_csv_rows(size_csv):
+        size = row.get('in_network_file_size', '')
+        if size and size.isdigit():
+            sizes[row['in_network_file_name']] = int(size)
+    return sizes
+
+def local_file_name(file_name: str, url: str) -> str:
+    """File name prefixed with a short hash of the URL, for names shared by several URLs"""
+    return f"{hashlib.sha1(url.encode()).hexdigest()[:12]}_{file_name}"
+
+def load_jobs(metadata_csv: str, size_csv: str) -> List[Dict]:
+    """
+    Build one job per unique in-network file URL from the MRF metadata table.
+
+    Different URLs can share a file name (e.g. the same name under several
+    dates or hosts), so jobs are keyed by URL and those files get a URL-derived
+    local_name to download to. Files with no probed size get the mean of the
+    known sizes so they are neither starved at the end of the queue nor treated
+    as the largest files.
+    """
+    sizes = load_file_sizes(size_csv)
+    default_size = sum(sizes.values()) // len(sizes) if sizes else 0
+
+    jobs = {}
+    urls_by_name = defaultdict(set)
+    for row in iter_csv_rows(metadata_csv):
+        url = row.get('in_network_file_location', '')
+        if not url or url in jobs:
+            continue
+        file_name = row.get('in_network_file_name', '') or 'Unknown'
+        urls_by_name[file_name].add(url)
+        jobs[url] = {
+            'file_name': file_name,
+            'url': url,
+            # The size table only has file names, so a shared name shares its probed size
+            'size': sizes.get(file_name, default_size),
+            'size_known': file_name in sizes,
+        }
+
+    for job in jobs.values():
+        shared = len(urls_by_name[job['file_name']]) > 1
+        job['local_name'] = local_file_name(job['file_name'], job['url']) if shared else job['file_name']
+    return list(jobs.values())
+
+def order_jobs(jobs: List[Dict]) -> List[Dict]:
+    """Order jobs largest-first (LPT)"""
+    return sorted(jobs, key=lambda job: job['size'], reverse=True)
+
+def projected_makespan(sizes: List[int], workers: int,
+                       bytes_per_second: float = config.SCHEDULER_BYTES_PER_SECOND) -> float:
+    """Simulate greedy list scheduling of the given sizes and return the projected makespan in seconds"""
+    loads = [0.0] * max(1, workers)
+    for size in sizes:
+        heapq.heapreplace(loads, loads[0] + size / bytes_per_second)
+    return max(loads)
+
+def download_mrf(job: Dict) -> Dict:
+    """
+    Default job: stream an MRF to the download directory.
+
+    Jobs flagged verify_hash by the deduplicator are hashed while they stream,
+    so their content can be compared without a second download.
+    """
+    import requests
+
+    os.makedirs(config.DOWNLOAD_DIR, exist_ok=True)
+    file_path = os.path.join(config.DOWNLOAD_DIR, job['local_name'])
+    digest = hashlib.sha256() if job.get('verify_hash') else None
+    bytes_written = 0
+    with requests.get(job['url'], stream=True, timeout=config.FILE_SIZE_REQUEST_TIMEOUT) as response:
+        response.raise_for_status()
+        with open(file_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=BUFFER_SIZE):
+                f.write(chunk)
+                if digest:
+                    digest.update(chunk)
+                bytes_written += len(chunk)
+    result = {'file_name': job['file_name'], 'url': job['url'], 'local_name': job['local_name'],
+              'file_path': file_path, 'bytes': bytes_written}
+    if digest:
+        result['sha256'] = digest.hexdigest()
+    return result
+
+def parsed_path(local_name: str) -> str:
+    """Path of the JSON lines output for a downloaded MRF"""
+    base = local_name
+    for suffix in ('.gz', '.json'):
+        if base.endswith(suffix):
+            base = base[:-len(suffix)]
+    return os.path.join(config.PARSED_DIR, f"{base}.jsonl")
+
+def parse_mrf(job: Dict) -> Dict:
+    """
+    Parse a downloaded MRF: resolve its provider references and write the
+    in_network items as JSON lines.
+    """
+    from provider_reference_index import ProviderReferenceIndex
+
+    os.makedirs(config.PARSED_DIR, exist_ok=True)
+    output_path = parsed_path(job['local_name'])
+    # One reference store per job, since jobs run in parallel processes
+    db_path = f"{output_path}.refs.db"
+    start_time = time.time()
+    items = 0
+    try:
+        with ProviderReferenceIndex(db_path) as index:
+            index.build(job['file_path'])
+            with open(output_path, 'w') as out:
+                for item in index.resolve_in_network(job['file_path']):
+                    out.write(json.dumps(item, separators=(',', ':')) + '\n')
+                    items += 1
+    finally:
+        if os.path.exists(db_path):
+            os.remove(db_path)
+    return {'file_name': job['file_name'], 'url': job['url'], 'local_name': job['local_name'],
+            'file_path': job['file_path'], 'bytes': os.path.getsize(job['file_path']),
+            'parsed_path': output_path, 'items': items, 'parse_seconds': time.time() - start_time}
+
+def download_and_parse_mrf(job: Dict) -> Dict:
+    """
+    Default job: download an MRF, then parse it in the same worker.
+
+    Both steps run inside one scheduled job, so the largest files start parsing
+    first too. verify_hash jobs are only downloaded; they are parsed after the
+    deduplicator has dropped duplicate copies.
+    """
+    result = download_mrf(job)
+    if job.get('verify_hash'):
+        return result
+    return dict(result, **parse_mrf(dict(job, file_path=result['file_path'])))
+
+class MrfJobScheduler:
+    """
+    Run MRF jobs largest-first across a process pool.
+
+    Only as many jobs as there are workers are in flight at once; the rest stay in
+    a shared largest-first queue, and whichever worker goes idle first takes the
+    next job from it. This keeps the few very large files from landing at the
+    tail of the run.
+    """
+
+    def __init__(self, job_fn: Callable[[Dict], Dict] = download_and_parse_mrf,
+                 max_workers: int = config.MAX_WORKERS,
+                 bytes_per_second: float = config.SCHEDULER_BYTES_PER_SECOND):
+        self.job_fn = job_fn
+        self.max_workers = max_workers
+        self.bytes_per_second = bytes_per_second
+        self.results: List[Dict] = []
+        self.errors: List[Dict] = []
+        self.report: Optional[Dict] = None
+
+    def run(self, jobs: List[Dict]) -> List[Dict]:
+        queue = order_jobs(jobs)
+        projected = projected_makespan([job['size'] for job in queue], self.max_workers, self.bytes_per_second)
+        logger.info(f"Scheduling {len(queue)} jobs on {self.max_workers} workers, projected makespan {projected:.1f}s")
+
+        start_time = time.time()
+        next_job = 0
+        in_flight = {}
+        with make_process_pool(self.max_workers, [self.job_fn.__module__]) as executor:
+            while next_job < len(queue) or in_flight:
+                while next_job < len(queue) and len(in_flight) < self.max_workers:
+                    job = queue[next_job]
+                    in_flight[executor.submit(self.job_fn, job)] = job
+                    next_job += 1
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = in_flight.pop(future)
+                    try:
+                        self.results.append(future.result())
+                    except Exception as e:
+                        logger.error(f"Error processing {job['url']}: {str(e)}")
+                        self.errors.append({'file_name': job['file_name'], 'url': job['url'], 'error': str(e)})
+
+        actual = time.time() - start_time
+        self.report = {
+            'jobs': len(queue),
+            'failed': len(self.errors),
+            'total_bytes': sum(job['size'] for job in queue),
+            'projected_makespan': projected,
+            'actual_makespan': actual,
+        }
+        logger.info(f"Scheduler finished: {self.report}")
+        return self.results
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Download and parse MRFs largest-first using the probed size table")
+    parser.add_argument("--metadata-csv", default=config.TOC_MRF_METADATA_CSV, help="MRF metadata table")
+    parser.add_argument("--size-csv", default=config.TOC_MRF_SIZE_DATA_CSV, help="MRF size table")
+    parser.add_argument("--workers", type=int, default=config.MAX_WORKERS, help="Number of worker processes")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the schedule and projected makespan")
+    parser.add_argument("--download-only", action="store_true", help="Download the MRFs without parsing them")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Download each unique MRF content once and write the dedup link table")
+    args = parser.parse_args()
+
+    jobs = load_jobs(args.metadata_csv, args.size_csv)
+    deduplicator = None
+    if args.dedup:
+        from mrf_dedup import MrfDeduplicator
+
+        deduplicator = MrfDeduplicator()
+        jobs = deduplicator.dedupe(jobs)
+        report = deduplicator.report
+        print(f"Dedup: {report['files']} files, {report['unique_files']} unique, "
+              f"{report['to_verify']} to verify by hash after download | "
+              f"Download bytes saved: {report['bytes_saved']:,} | "
+              f"Estimated download time saved: {report['estimated_download_seconds_saved'] / 60:.2f} minutes")
+
+    if args.dry_run:
+        ordered = order_jobs(jobs)
+        for job in ordered:
+            print(f"{job['size']:>15,}  {job['local_name']}")
+        projected = projected_makespan([job['size'] for job in ordered], args.workers)
+        print(f"Projected makespan: {projected / 60:.2f} minutes for {len(ordered)} jobs on {args.workers} workers")
+        if deduplicator:
+            deduplicator.write_links(config.TOC_MRF_DEDUP_LINKS_CSV)
+        return
+
+    job_fn = download_mrf if args.download_only else download_and_parse_mrf
+    scheduler = MrfJobScheduler(job_fn=job_fn, max_workers=args.workers)
+    results = scheduler.run(jobs)
+    report = scheduler.report
+    print(f"Jobs: {report['jobs']} | Failed: {report['failed']}")
+    print(f"Projected makespan: {report['projected_makespan'] / 60:.2f} minutes")
+    print(f"Actual makespan: {report['actual_makespan'] / 60:.2f} minutes")
+
+    if deduplicator:
+        # Duplicate copies found by hash are removed from the download directory
+        results = deduplicator.resolve_downloads(results)
+        deduplicator.write_links(config.TOC_MRF_DEDUP_LINKS_CSV)
+        report = deduplicator.report
+        print(f"Dedup: {report['unique_files']} unique files to parse | "
+              f"Duplicates found by hash: {report['duplicates_after_download']} "
+              f"({report['duplicate_bytes_downloaded']:,} bytes downloaded, not saved)")
+
+    # Hash-verified files were only downloaded; parse the copies that remain, largest-first
+    parse_jobs = [dict(result, size=result['bytes']) for result in results
+                  if not args.download_only and 'parsed_path' not in result]
+    if parse_jobs:
+        scheduler = MrfJobScheduler(job_fn=parse_mrf, max_workers=args.workers)
+        results = [result for result in results if 'parsed_path' in result] + scheduler.run(parse_jobs)
+        report = scheduler.report
+        print(f"Parse jobs: {report['jobs']} | Failed: {report['failed']} | "
+              f"Actual makespan: {report['actual_makespan'] / 60:.2f} minutes")
+
+    if deduplicator:
+        report = deduplicator.report
+        parse_seconds_saved = deduplicator.estimate_parse_savings(results)
+        print(f"Parses avoided: {report['parses_avoided']} | Bytes not parsed: {report['bytes_not_parsed']:,}"
+              + (f" | Estimated parse CPU time saved: {parse_seconds_saved / 60:.2f} minutes"
+                 if parse_seconds_saved is not None else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import csv
+from typing import BinaryIO, Dict, Iterator
+
+# Upper bound on a single read, so the NUL padding is never read as one huge line
+READ_LIMIT = 64 * 1024
+
+def iter_data_lines(f: BinaryIO) -> Iterator[str]:
+    """Yield decoded lines of a binary file up to the first NUL byte"""
+    parts = []
+    while True:
+        chunk = f.readline(READ_LIMIT)
+        end = chunk.find(b'\0')
+        if end != -1:
+            chunk = chunk[:end]
+        parts.append(chunk)
+        if end != -1 or not chunk:
+            line = b''.join(parts)
+            if line:
+                yield line.decode()
+            return
+        if chunk.endswith(b'\n'):
+            yield b''.join(parts).decode()
+            parts = []
+
+def iter_csv_rows(file_path: str) -> Iterator[Dict[str, str]]:
+    """
+    Iterate over rows of an output CSV written by the mmap processors.
+
+    The processors pre-size their files with NUL bytes, so reading stops at the
+    first NUL: everything after the last written row is padding.
+    """
+    with open(file_path, 'rb') as f:
+        for row in csv.DictReader(iter_data_lines(f)):
+            yield row
@@ -0,0 +1,323 @@
+import os
+import sys
+import gzip
+import json
+import sqlite3
+import logging
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from typing import Dict, Iterator, List, Optional
+import ijson
+import config
+
+logger = logging.getLogger(__name__)
+
+# Per-entry bookkeeping of an OrderedDict (hash table slot and linked-list node)
+CACHE_ENTRY_OVERHEAD = 100
+
+def cache_entry_size(key: str, payload: str) -> int:
+    return sys.getsizeof(key) + sys.getsizeof(payload) + CACHE_ENTRY_OVERHEAD
+
+def open_mrf(file_path):
+    """Open an MRF for binary streaming, transparently handling .gz files"""
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rb')
+    return open(file_path, 'rb')
+
+def reference_file_name(location: str) -> str:
+    """File name of a provider reference location, which may be a URL or a local path"""
+    return os.path.basename(urlparse(location).path)
+
+def fetch_reference_file(location: str) -> Optional[Dict]:
+    """Load a provider reference file ({provider_groups, version}) from a local path or URL"""
+    try:
+        if os.path.exists(location):
+            with open_mrf(location) as f:
+                return json.load(f)
+        import requests
+
+        response = requests.get(location, timeout=config.FILE_SIZE_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        content = response.content
+        # requests only decompresses Content-Encoding: gzip, not .json.gz objects
+        if content[:2] == b'\x1f\x8b':
+            content = gzip.decompress(content)
+        return json.loads(content)
+    except Exception as e:
+        logger.warning(f"Could not load provider reference file {location}: {str(e)}")
+        return None
+
+class ProviderReferenceIndex:
+    """
+    Disk-backed store of provider_references for in-network-rate MRFs.
+
+    The first pass streams every provider_references entry into SQLite so the
+    join pass never holds the full reference table in memory. Entries that only
+    carry a location are completed from their reference file (provider_groups
+    without an id) before the join pass. Lookups go through
+    an LRU cache bounded by half of the configured memory limit; the other half is
+    given to SQLite's page cache.
+    """
+
+    def __init__(self, db_path: str = config.PROVIDER_REF_DB,
+                 memory_limit_mb: int = config.PROVIDER_REF_MEMORY_LIMIT_MB,
+                 insert_batch: int = config.PROVIDER_REF_INSERT_BATCH,
+                 fetch_threads: int = config.MAX_THREADS_FILE_SIZE,
+                 fetch_reference=fetch_reference_file):
+        self.db_path = db_path
+        self.memory_limit = memory_limit_mb * 1024 * 1024
+        self.cache_limit = self.memory_limit // 2
+        self.insert_batch = insert_batch
+        self.fetch_threads = fetch_threads
+        self.fetch_reference = fetch_reference
+        self.conn = None
+        self.cache: OrderedDict = OrderedDict()
+        self.cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.unresolved = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        self.conn = sqlite3.connect(self.db_path)
+        # The index is a rebuildable scratch file, so durability is not needed
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute(f"PRAGMA cache_size=-{max(1, (self.memory_limit // 2) // 1024)}")
+        self.reset()
+
+    def reset(self):
+        """
+        Drop all stored references and start a new run.
+
+        provider_group_id values are only unique within one MRF and the same small
+        integers appear in every file, so references must never carry over from an
+        earlier MRF into the next.
+        """
+        with self.conn:
+            self.conn.execute("DROP TABLE IF EXISTS provider_references")
+            self.conn.execute(
+                "CREATE TABLE provider_references ("
+                "provider_group_id TEXT PRIMARY KEY, "
+                "source_file TEXT, "
+                # Set while the reference still has to be loaded from its file
+                "location TEXT, "
+                "location_name TEXT, "
+                "payload TEXT NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            self.conn.execute("CREATE INDEX provider_references_location ON provider_references (location_name)")
+        self.cache.clear()
+        self.cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.unresolved = 0
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+        self.cache.clear()
+        self.cache_bytes = 0
+
+    def build(self, file_path: str, resolve_locations: bool = True) -> int:
+        """
+        Stream provider_references from an MRF into a fresh store.
+
+        Any references from a previous build() are dropped first. References given
+        only by location are then loaded from their files unless resolve_locations
+        is False, in which case local copies can be added with
+        build_from_reference_file() before calling resolve_locations().
+        """
+        self.reset()
+        source_file = os.path.basename(file_path)
+        rows = []
+        total = 0
+        with open_mrf(file_path) as f:
+            for ref in ijson.items(f, 'provider_references.item', use_float=True):
+                ref_id = ref.pop('provider_group_id', None)
+                if ref_id is None:
+                    logger.warning(f"provider_reference without provider_group_id in {file_path}")
+                    continue
+                location = ref.get('location') if 'provider_groups' not in ref else None
+                rows.append((str(ref_id), source_file, location,
+                             reference_file_name(location) if location else None,
+                             json.dumps(ref, separators=(',', ':'))))
+                if len(rows) >= self.insert_batch:
+                    total += self._insert_rows(rows)
+        if rows:
+            total += self._insert_rows(rows)
+        logger.info(f"Indexed {total} provider references from {file_path}")
+        if resolve_locations:
+            self.resolve_locations()
+        return total
+
+    def build_from_reference_file(self, file_path: str) -> int:
+        """
+        Index a local provider reference file.
+
+        A file without provider_group_id (the CMS layout) completes every stored
+        reference whose location points to a file of the same name. A file with
+        provider_group_id is stored as a reference of its own.
+        """
+        with open_mrf(file_path) as f:
+            ref = json.load(f)
+        ref_id = ref.pop('provider_group_id', None)
+        if ref_id is not None:
+            return self._insert_rows([(str(ref_id), os.path.basename(file_path), None, None,
+                                       json.dumps(ref, separators=(',', ':')))])
+
+        ids = [row[0] for row in self.conn.execute(
+            "SELECT provider_group_id FROM provider_references WHERE location_name = ?",
+            (os.path.basename(file_path),))]
+        if not ids:
+            logger.warning(f"No provider reference points to {file_path}")
+            return 0
+        self._attach_groups(ids, ref, os.path.basename(file_path))
+        return len(ids)
+
+    def resolve_locations(self) -> int:
+        """Load the reference file of every reference still given only by location"""
+        pending = {}
+        for ref_id, location in self.conn.execute(
+                "SELECT provider_group_id, location FROM provider_references WHERE location IS NOT NULL"):
+            pending.setdefault(location, []).append(ref_id)
+        if not pending:
+            return 0
+
+        resolved = 0
+        with ThreadPoolExecutor(max_workers=self.fetch_threads) as executor:
+            locations = list(pending)
+            for location, ref in zip(locations, executor.map(self.fetch_reference, locations)):
+                if ref is None:
+                    continue
+                self._attach_groups(pending[location], ref, reference_file_name(location))
+                resolved += len(pending[location])
+        logger.info(f"Loaded {resolved} of {sum(len(ids) for ids in pending.values())} "
+                    f"provider references from {len(pending)} reference files")
+        return resolved
+
+    def _attach_groups(self, ids: List[str], ref: Dict, source_file: str):
+        with self.conn:
+            for ref_id in ids:
+                row = self.conn.execute(
+                    "SELECT payload FROM provider_references WHERE provider_group_id = ?", (ref_id,)).fetchone()
+                payload = json.loads(row[0])
+                payload['provider_groups'] = ref.get('provider_groups', [])
+                self.conn.execute(
+                    "UPDATE provider_references SET payload = ?, source_file = ?, location = NULL, "
+                    "location_name = NULL WHERE provider_group_id = ?",
+                    (json.dumps(payload, separators=(',', ':')), source_file, ref_id))
+        # Cached payloads may predate the update
+        self.cache.clear()
+        self.cache_bytes = 0
+
+    def _insert_rows(self, rows: List) -> int:
+        count = len(rows)
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO provider_references VALUES (?, ?, ?, ?, ?)", rows)
+        rows.clear()
+        return count
+
+    def lookup(self, ref_id) -> Optional[Dict]:
+        """Return the stored reference for ref_id, or None if it is unknown"""
+        key = str(ref_id)
+        payload = self.cache.get(key)
+        if payload is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return json.loads(payload)
+
+        self.misses += 1
+        row = self.conn.execute(
+            "SELECT payload FROM provider_references WHERE provider_group_id = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        payload = row[0]
+        # The cache holds the encoded payload rather than the decoded dict, so its
+        # counted size matches the memory it really uses; hits decode again
+        size = cache_entry_size(key, payload)
+        if size <= self.cache_limit:
+            self.cache[key] = payload
+            self.cache_bytes += size
+            while self.cache_bytes > self.cache_limit:
+                evicted_key, evicted_payload = self.cache.popitem(last=False)
+                self.cache_bytes -= cache_entry_size(evicted_key, evicted_payload)
+        return json.loads(payload)
+
+    def resolve_rate(self, rate: Dict) -> Dict:
+        """Replace provider_references in a negotiated_rates entry with provider_groups"""
+        refs = rate.pop('provider_references', None)
+        if not refs:
+            return rate
+        groups = rate.setdefault('provider_groups', [])
+        for ref_id in refs:
+            ref = self.lookup(ref_id)
+            if ref is None:
+                self.unresolved += 1
+                logger.warning(f"Unresolved provider reference: {ref_id}")
+                continue
+            if 'provider_groups' in ref:
+                groups.extend(ref['provider_groups'])
+            else:
+                # Only a location, and its reference file could not be loaded
+                self.unresolved += 1
+                logger.warning(f"Provider reference {ref_id} not loaded from {ref.get('location')}")
+            if 'location' in ref:
+                rate.setdefault('provider_group_locations', []).append(ref['location'])
+        return rate
+
+    def resolve_in_network(self, file_path: str) -> Iterator[Dict]:
+        """Stream in_network items from an MRF with provider references resolved"""
+        with open_mrf(file_path) as f:
+            for item in ijson.items(f, 'in_network.item', use_float=True):
+                for rate in item.get('negotiated_rates', []):
+                    self.resolve_rate(rate)
+                yield item
+
+    def stats(self) -> Dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'unresolved': self.unresolved,
+            'cache_entries': len(self.cache),
+            'cache_bytes': self.cache_bytes,
+        }
+
+def main():
+    """Resolve provider references for an MRF and write in_network items as JSON lines"""
+    parser = argparse.ArgumentParser(description="Resolve provider references in an in-network-rate MRF")
+    parser.add_argument("mrf_file", help="In-network-rate MRF (.json or .json.gz)")
+    parser.add_argument("output_file", help="Output JSON lines file for resolved in_network items")
+    parser.add_argument("--reference-file", action="append", default=[],
+                        help="Local copy of a provider reference file, matched to references by file name (may be repeated)")
+    parser.add_argument("--db", default=config.PROVIDER_REF_DB, help="SQLite index path")
+    parser.add_argument("--memory-limit-mb", type=int, default=config.PROVIDER_REF_MEMORY_LIMIT_MB,
+                        help="Memory budget for the SQLite page cache and LRU cache")
+    args = parser.parse_args()
+
+    with ProviderReferenceIndex(args.db, args.memory_limit_mb) as index:
+        index.build(args.mrf_file, resolve_locations=False)
+        for reference_file in args.reference_file:
+            index.build_from_reference_file(reference_file)
+        # Whatever the local files did not cover is loaded from its location
+        index.resolve_locations()
+
+        with open(args.output_file, 'w') as out:
+            for item in index.resolve_in_network(args.mrf_file):
+                out.write(json.dumps(item, separators=(',', ':')) + '\n')
+
+        print(f"Resolution stats: {index.stats()}")
+
+if __name__ == "__main__":
+    main()
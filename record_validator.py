@@ -0,0 +1,181 @@
+import os
+import json
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import config
+
+logger = logging.getLogger(__name__)
+
+PLAN_ID_TYPES = ('ein', 'hios')
+PLAN_MARKET_TYPES = ('group', 'individual')
+PLAN_FIELDS = ('plan_name', 'plan_id_type', 'plan_id', 'plan_market_type')
+
+def check_required(obj) -> List[Tuple[str, str]]:
+    """
+    Cheap structural check run on every record.
+
+    Requires what every ToC reporting_structure record must have: a string
+    reporting_entity_name, a non-empty reporting_plans list, and
+    in_network_files (a list) or allowed_amount_file. Per-plan and per-file
+    fields are left to the sampled check_schema() to keep this O(1) per record.
+    """
+    if not isinstance(obj, dict):
+        return [('type:record', type(obj).__name__)]
+    errors = []
+    name = obj.get('reporting_entity_name')
+    if name is None:
+        errors.append(('missing_key:reporting_entity_name', ''))
+    elif not isinstance(name, str):
+        errors.append(('type:reporting_entity_name', type(name).__name__))
+    plans = obj.get('reporting_plans')
+    if plans is None:
+        errors.append(('missing_key:reporting_plans', ''))
+    elif not isinstance(plans, list):
+        errors.append(('type:reporting_plans', type(plans).__name__))
+    elif not plans:
+        errors.append(('empty:reporting_plans', ''))
+    files = obj.get('in_network_files')
+    if files is None:
+        if 'allowed_amount_file' not in obj:
+            errors.append(('missing_key:in_network_files', ''))
+    elif not isinstance(files, list):
+        errors.append(('type:in_network_files', type(files).__name__))
+    return errors
+
+def _check_file(file_info: Dict, prefix: str) -> List[Tuple[str, str]]:
+    errors = []
+    if not isinstance(file_info.get('description'), str):
+        errors.append((f'schema:{prefix}.description', repr(file_info.get('description'))[:200]))
+    location = file_info.get('location')
+    if not isinstance(location, str) or not location.startswith(('http://', 'https://')):
+        errors.append((f'schema:{prefix}.location', repr(location)[:200]))
+    return errors
+
+def check_schema(obj: Dict) -> List[Tuple[str, str]]:
+    """
+    Full check of a reporting_structure object against the ToC table-of-contents schema.
+
+    Every plan must carry plan_name, plan_id_type (EIN/HIOS), plan_id and
+    plan_market_type (group/individual); every file must have a description
+    and an http(s) location. Assumes check_required() passed.
+    """
+    errors = []
+    for plan in obj['reporting_plans']:
+        if not isinstance(plan, dict):
+            errors.append(('schema:reporting_plans.item', type(plan).__name__))
+            continue
+        for field in PLAN_FIELDS:
+            if not isinstance(plan.get(field), str) or not plan[field]:
+                errors.append((f'schema:reporting_plans.{field}', repr(plan.get(field))[:200]))
+        if isinstance(plan.get('plan_id_type'), str) and plan['plan_id_type'].lower() not in PLAN_ID_TYPES:
+            errors.append(('schema:reporting_plans.plan_id_type', plan['plan_id_type'][:200]))
+        if isinstance(plan.get('plan_market_type'), str) and plan['plan_market_type'].lower() not in PLAN_MARKET_TYPES:
+            errors.append(('schema:reporting_plans.plan_market_type', plan['plan_market_type'][:200]))
+
+    for file_info in obj.get('in_network_files', []):
+        if not isinstance(file_info, dict):
+            errors.append(('schema:in_network_files.item', type(file_info).__name__))
+            continue
+        errors.extend(_check_file(file_info, 'in_network_files'))
+    allowed_amount_file = obj.get('allowed_amount_file')
+    if allowed_amount_file is not None:
+        if isinstance(allowed_amount_file, dict):
+            errors.extend(_check_file(allowed_amount_file, 'allowed_amount_file'))
+        else:
+            errors.append(('schema:allowed_amount_file', type(allowed_amount_file).__name__))
+    return errors
+
+class RecordValidator:
+    """
+    Streaming data-quality stage for index records.
+
+    check_required() runs on every record and decides whether it can be
+    processed. check_schema() runs on every sample_every-th record; its findings
+    are counted and quarantined, but the record is still processed. Counters are
+    kept per error class, and at most max_quarantined bad records (each cut to
+    max_record_bytes) are written to the quarantine file as JSON lines.
+    """
+
+    def __init__(self, sample_rate: float = config.VALIDATION_SAMPLE_RATE,
+                 quarantine_file: str = config.QUARANTINE_FILE,
+                 max_quarantined: int = config.QUARANTINE_MAX_RECORDS,
+                 max_record_bytes: int = config.QUARANTINE_MAX_RECORD_BYTES):
+        self.sample_every = round(1 / sample_rate) if sample_rate > 0 else 0
+        self.quarantine_file = quarantine_file
+        self.max_quarantined = max_quarantined
+        self.max_record_bytes = max_record_bytes
+        self.quarantine = None
+        self.error_counts: Counter = Counter()
+        self.records_validated = 0
+        self.records_sampled = 0
+        self.records_rejected = 0
+        self.records_quarantined = 0
+        # The quarantine file is only created for the first bad record, so a
+        # clean run must not leave the previous run's file behind
+        if os.path.exists(quarantine_file):
+            os.remove(quarantine_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def validate(self, obj, raw=None, position: Optional[int] = None) -> bool:
+        """Check one decoded record; returns False if it should be skipped"""
+        self.records_validated += 1
+        errors = check_required(obj)
+        if errors:
+            self.records_rejected += 1
+            self._record_errors(errors, raw, position)
+            return False
+
+        if self.sample_every and self.records_validated % self.sample_every == 0:
+            self.records_sampled += 1
+            errors = check_schema(obj)
+            if errors:
+                self._record_errors(errors, raw, position)
+        return True
+
+    def record_error(self, error_class: str, detail: str = '', raw=None, position: Optional[int] = None):
+        """Count and quarantine a record that failed outside validate(), e.g. a decode error"""
+        self.records_rejected += 1
+        self._record_errors([(error_class, detail)], raw, position)
+
+    def _record_errors(self, errors: List[Tuple[str, str]], raw, position: Optional[int]):
+        for error_class, _ in errors:
+            self.error_counts[error_class] += 1
+        if self.records_quarantined >= self.max_quarantined:
+            return
+
+        if self.quarantine is None:
+            self.quarantine = open(self.quarantine_file, 'w')
+        if isinstance(raw, (bytes, bytearray, memoryview)):
+            record = bytes(raw[:self.max_record_bytes]).decode('utf-8', errors='replace')
+        elif raw is not None:
+            record = json.dumps(raw)[:self.max_record_bytes]
+        else:
+            record = None
+        entry = {
+            'errors': [{'class': error_class, 'detail': detail} for error_class, detail in errors],
+            'position': position,
+            'record': record,
+        }
+        self.quarantine.write(json.dumps(entry) + '\n')
+        self.records_quarantined += 1
+
+    def summary(self) -> Dict:
+        return {
+            'records_validated': self.records_validated,
+            'records_sampled': self.records_sampled,
+            'records_rejected': self.records_rejected,
+            'records_quarantined': self.records_quarantined,
+            'error_counts': dict(self.error_counts.most_common()),
+        }
+
+    def close(self):
+        if self.quarantine is not None:
+            self.quarantine.close()
+            self.quarantine = None
+        logger.info(f"Validation summary: {self.summary()}")
@@ -0,0 +1,194 @@
+import time
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+import config
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_STATUSES = (429, 503)
+
+class CircuitOpenError(Exception):
+    pass
+
+class HostState:
+    """
+    Per-host admission control for size probes.
+
+    Combines a token bucket (steady request rate), an AIMD concurrency limit that
+    grows by roughly one slot per window of successes and halves on 429/503, and a
+    circuit breaker that stops probing a host for a cooldown after repeated
+    failures. After the cooldown a single failure re-opens the circuit.
+    """
+
+    def __init__(self, rate: float = config.SIZE_PROBE_RATE_PER_HOST,
+                 burst: int = config.SIZE_PROBE_BURST_PER_HOST,
+                 initial_concurrency: int = config.SIZE_PROBE_INITIAL_CONCURRENCY,
+                 max_concurrency: int = config.SIZE_PROBE_MAX_CONCURRENCY,
+                 failure_threshold: int = config.SIZE_PROBE_FAILURE_THRESHOLD,
+                 cooldown: float = config.SIZE_PROBE_CIRCUIT_COOLDOWN):
+        self.condition = threading.Condition()
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.limit = float(initial_concurrency)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                if now < self.open_until:
+                    raise CircuitOpenError(f"circuit open for {self.open_until - now:.0f}s")
+                wait = None
+                if self.in_flight < int(self.limit):
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                self.condition.wait(wait)
+
+    def release(self, outcome: str):
+        """Record the outcome of a probe: 'ok', 'throttled' or 'failed'"""
+        with self.condition:
+            self.in_flight -= 1
+            if outcome == 'ok':
+                self.failures = 0
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            elif outcome == 'throttled':
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.failures += 1
+                if self.failures >= self.failure_threshold:
+                    self.open_until = time.monotonic() + self.cooldown
+                    self.failures = self.failure_threshold - 1
+            self.condition.notify_all()
+
+class SizeProbe:
+    """
+    Determine MRF sizes without downloading them.
+
+    Tries HEAD first and falls back to a GET with Range: bytes=0-0 (reading the
+    total from Content-Range) when HEAD is rejected or has no usable
+    Content-Length, as happens with signed S3/blob URLs and chunked responses.
+    Requests are admitted per host through HostState, throttled responses are
+    retried with backoff, and each host can have its own timeout.
+    """
+
+    def __init__(self, timeout: float = config.FILE_SIZE_REQUEST_TIMEOUT,
+                 host_timeouts: Optional[Dict[str, float]] = None,
+                 max_retries: int = config.SIZE_PROBE_MAX_RETRIES,
+                 max_backoff: float = config.SIZE_PROBE_MAX_BACKOFF,
+                 host_state_factory=HostState):
+        self.timeout = timeout
+        self.host_timeouts = host_timeouts or {}
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+        self.host_state_factory = host_state_factory
+        self.hosts: Dict[str, HostState] = {}
+        self.hosts_lock = threading.Lock()
+        self.local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_maxsize=config.SIZE_PROBE_MAX_CONCURRENCY)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self.local.session = session
+        return session
+
+    def host_state(self, host: str) -> HostState:
+        with self.hosts_lock:
+            if host not in self.hosts:
+                self.hosts[host] = self.host_state_factory()
+            return self.hosts[host]
+
+    def _backoff(self, attempt: int, response_headers) -> float:
+        retry_after = response_headers.get('Retry-After', '') if response_headers is not None else ''
+        if retry_after.isdigit():
+            return min(self.max_backoff, float(retry_after))
+        return min(self.max_backoff, 0.5 * 2 ** attempt)
+
+    def _probe_once(self, url: str, timeout: float) -> Tuple[Optional[int], str, int, object]:
+        session = self._session()
+        response = session.head(url, allow_redirects=True, timeout=timeout)
+        if response.status_code in THROTTLE_STATUSES:
+            return None, f"HEAD throttled ({response.status_code})", response.status_code, response.headers
+
+        length = response.headers.get('Content-Length', '')
+        chunked = 'chunked' in response.headers.get('Transfer-Encoding', '').lower()
+        if response.ok and length.isdigit() and not chunked:
+            return int(length), '', response.status_code, response.headers
+
+        head_status = response.status_code
+        with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True,
+                         allow_redirects=True, timeout=timeout) as response:
+            if response.status_code in THROTTLE_STATUSES:
+                return None, f"GET throttled ({response.status_code})", response.status_code, response.headers
+
+            content_range = response.headers.get('Content-Range', '')
+            if response.status_code == 206 and '/' in content_range:
+                total = content_range.rsplit('/', 1)[1].strip()
+                if total.isdigit():
+                    return int(total), 'Size from ranged GET', response.status_code, response.headers
+
+            length = response.headers.get('Content-Length', '')
+            if response.status_code == 200 and length.isdigit():
+                # The server ignored the Range header; the body is never read
+                return int(length), 'Size from GET', response.status_code, response.headers
+
+            return (None, f"Size not available (HEAD {head_status}, GET {response.status_code})",
+                    response.status_code, response.headers)
+
+    def probe(self, url: str) -> Tuple[Optional[int], str]:
+        """Return (size, remarks) for a URL, mirroring get_file_size()"""
+        host = urlparse(url).netloc
+        state = self.host_state(host)
+        timeout = self.host_timeouts.get(host, self.timeout)
+        remarks = ''
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                state.acquire()
+            except CircuitOpenError as e:
+                return None, f"Error: {host} {str(e)}"
+
+            outcome = 'failed'
+            headers = None
+            try:
+                size, remarks, status, headers = self._probe_once(url, timeout)
+                if status in THROTTLE_STATUSES:
+                    outcome = 'throttled'
+                else:
+                    # Other server errors count towards opening the circuit
+                    outcome = 'failed' if status >= 500 else 'ok'
+                    return size, remarks
+            except requests.RequestException as e:
+                return None, f"Error: {str(e)}"
+            finally:
+                state.release(outcome)
+
+            if attempt == self.max_retries:
+                break
+            delay = self._backoff(attempt, headers)
+            logger.info(f"Throttled by {host}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+        return None, f"Error: {remarks} after {self.max_retries + 1} attempts"
@@ -0,0 +1,259 @@
+import os
+import io
+import glob
+import sys
+import csv
+import mmap
+import heapq
+import struct
+import hashlib
+import logging
+import argparse
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+import config
+
+logger = logging.getLogger(__name__)
+
+INDEX_COLUMNS = ['plan_id', 'reporting_entity_name', 'in_network_file_name']
+# Each index entry is (64-bit key hash, byte offset of the row in the table)
+RECORD = struct.Struct('<QQ')
+# Index files start with the size and mtime of the table they were built for
+HEADER = struct.Struct('<4sIQQ')
+INDEX_MAGIC = b'TIDX'
+INDEX_VERSION = 1
+
+def key_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'little')
+
+def index_path(table_path: str, column: str) -> str:
+    return f"{table_path}.{column}.idx"
+
+def remove_index(table_path: str, columns: List[str] = INDEX_COLUMNS):
+    """Delete the index files of a table, including spill runs left by an interrupted build"""
+    for column in columns:
+        path = index_path(table_path, column)
+        for stale in [path] + glob.glob(glob.escape(path) + '.run*'):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+def table_signature(table_path: str) -> Tuple[int, int]:
+    stat = os.stat(table_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def iter_records(data, pos: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (offset, raw record) for every CSV record in a bytes-like object from pos on.
+
+    A record continues onto the next physical line while it has an odd number of
+    quote characters, which is how quoted fields with embedded newlines look.
+    """
+    size = len(data)
+    while pos < size:
+        # The mmap processors leave NUL padding after the last row
+        if data[pos:pos + 1] == b'\0':
+            return
+        start = pos
+        quotes = 0
+        while True:
+            end = data.find(b'\n', pos)
+            end = size if end == -1 else end + 1
+            quotes += data[pos:end].count(b'"')
+            pos = end
+            if quotes % 2 == 0 or pos >= size:
+                break
+        yield start, data[start:pos]
+
+def parse_record(record: bytes) -> List[str]:
+    return next(csv.reader(io.StringIO(record.decode())), [])
+
+class TableIndexWriter:
+    """
+    Build sorted hash indexes for selected columns of an output table.
+
+    Rows are fed in with their byte offsets as they are written. Entries are held
+    in compact arrays and spilled to sorted run files every run_size entries; the
+    runs are merged into the final index files by finalize().
+    """
+
+    def __init__(self, table_path: str, fieldnames: List[str], columns: List[str] = INDEX_COLUMNS,
+                 run_size: int = config.TABLE_INDEX_RUN_SIZE):
+        self.table_path = table_path
+        self.columns = [column for column in columns if column in fieldnames]
+        self.run_size = run_size
+        self.entries = {column: array('Q') for column in self.columns}
+        self.runs: Dict[str, List[str]] = {column: [] for column in self.columns}
+        self.total_entries = 0
+
+    def add(self, row: Dict, offset: int):
+        for column in self.columns:
+            entries = self.entries[column]
+            entries.append(key_hash(str(row.get(column, ''))))
+            entries.append(offset)
+        self.total_entries += 1
+        if self.total_entries % self.run_size == 0:
+            self._spill()
+
+    def _sorted_pairs(self, column: str) -> List[Tuple[int, int]]:
+        entries = self.entries[column]
+        return sorted(zip(entries[0::2], entries[1::2]))
+
+    def _spill(self):
+        for column in self.columns:
+            if not self.entries[column]:
+                continue
+            run_path = f"{index_path(self.table_path, column)}.run{len(self.runs[column])}"
+            with open(run_path, 'wb') as f:
+                for pair in self._sorted_pairs(column):
+                    f.write(RECORD.pack(*pair))
+            self.runs[column].append(run_path)
+            self.entries[column] = array('Q')
+
+    @staticmethod
+    def _read_run(run_path: str) -> Iterator[Tuple[int, int]]:
+        with open(run_path, 'rb') as f:
+            while True:
+                chunk = f.read(RECORD.size * 4096)
+                if not chunk:
+                    break
+                yield from RECORD.iter_unpack(chunk)
+
+    def finalize(self):
+        """Merge the runs into the index files; call once the table is completely written"""
+        table_size, table_mtime = table_signature(self.table_path)
+        for column in self.columns:
+            sources = [self._read_run(run_path) for run_path in self.runs[column]]
+            sources.append(iter(self._sorted_pairs(column)))
+            with open(index_path(self.table_path, column), 'wb') as f:
+                f.write(HEADER.pack(INDEX_MAGIC, INDEX_VERSION, table_size, table_mtime))
+                for pair in heapq.merge(*sources):
+                    f.write(RECORD.pack(*pair))
+            for run_path in self.runs[column]:
+                os.remove(run_path)
+            self.runs[column] = []
+            self.entries[column] = array('Q')
+        logger.info(f"Indexed {self.total_entries} rows of {self.table_path} on {self.columns}")
+
+def build_index(table_path: str, columns: List[str] = INDEX_COLUMNS) -> TableIndexWriter:
+    """Build indexes for an already written table with a single sequential scan"""
+    with open(table_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        records = iter_records(mm)
+        _, header = next(records)
+        fieldnames = parse_record(header)
+        writer = TableIndexWriter(table_path, fieldnames, columns)
+        for offset, record in records:
+            writer.add(dict(zip(fieldnames, parse_record(record))), offset)
+    writer.finalize()
+    return writer
+
+class TableIndex:
+    """Look up rows of an output table by column value using its on-disk index"""
+
+    def __init__(self, table_path: str):
+        self.table_path = table_path
+        self.table_file = open(table_path, 'rb')
+        self.table = mmap.mmap(self.table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        _, header = next(iter_records(self.table))
+        self.fieldnames = parse_record(header)
+        self.indexes: Dict[str, Tuple] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for index_file, index_map in self.indexes.values():
+            index_map.close()
+            index_file.close()
+        self.indexes.clear()
+        self.table.close()
+        self.table_file.close()
+
+    def _index(self, column: str) -> Optional[mmap.mmap]:
+        if column not in self.indexes:
+            path = index_path(self.table_path, column)
+            if not os.path.exists(path):
+                raise ValueError(f"No index for column {column} of {self.table_path}")
+            with open(path, 'rb') as f:
+                header = f.read(HEADER.size)
+            if len(header) < HEADER.size or HEADER.unpack(header)[:2] != (INDEX_MAGIC, INDEX_VERSION):
+                raise ValueError(f"{path} is not a table index; rebuild it with: python table_index.py build --table {self.table_path}")
+            if HEADER.unpack(header)[2:] != table_signature(self.table_path):
+                raise ValueError(f"{path} is stale: {self.table_path} changed after it was indexed; "
+                                 f"rebuild it with: python table_index.py build --table {self.table_path}")
+            if os.path.getsize(path) == HEADER.size:
+                return None
+            index_file = open(path, 'rb')
+            self.indexes[column] = (index_file, mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ))
+        return self.indexes[column][1]
+
+    def _offsets(self, column: str, value: str) -> List[int]:
+        index_map = self._index(column)
+        if index_map is None:
+            return []
+        target = key_hash(value)
+        count = (len(index_map) - HEADER.size) // RECORD.size
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if RECORD.unpack_from(index_map, HEADER.size + mid * RECORD.size)[0] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        offsets = []
+        while lo < count:
+            entry_hash, offset = RECORD.unpack_from(index_map, HEADER.size + lo * RECORD.size)
+            if entry_hash != target:
+                break
+            offsets.append(offset)
+            lo += 1
+        return offsets
+
+    def row_at(self, offset: int) -> Dict[str, str]:
+        record = next(iter_records(self.table, offset), None) if offset < len(self.table) else None
+        if record is None:
+            raise ValueError(f"Offset {offset} is past the end of {self.table_path}; the index is stale")
+        return dict(zip(self.fieldnames, parse_record(record[1])))
+
+    def lookup(self, column: str, value: str) -> List[Dict[str, str]]:
+        """Return all rows whose column equals value"""
+        rows = []
+        for offset in self._offsets(column, value):
+            row = self.row_at(offset)
+            # Hashes can collide, so confirm against the row itself
+            if row.get(column) == value:
+                rows.append(row)
+        return rows
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Build or query indexes over the output CSV tables")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Index an existing table")
+    build_parser.add_argument("--table", default=config.TOC_MRF_METADATA_CSV, help="Table to index")
+
+    lookup_parser = subparsers.add_parser("lookup", help="Print rows matching a column value")
+    lookup_parser.add_argument("column", choices=INDEX_COLUMNS, help="Indexed column")
+    lookup_parser.add_argument("value", help="Value to look up")
+    lookup_parser.add_argument("--table", default=config.TOC_MRF_METADATA_CSV, help="Table to query")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        writer = build_index(args.table)
+        print(f"Indexed {writer.total_entries:,} rows on {', '.join(writer.columns)}")
+        return
+
+    with TableIndex(args.table) as index:
+        try:
+            rows = index.lookup(args.column, args.value)
+        except ValueError as e:
+            parser.error(str(e))
+        writer = csv.DictWriter(sys.stdout, fieldnames=index.fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import unittest
+import os
+import csv
+import json
+import tempfile
+from unittest.mock import patch
+import record_scanner
+from anthem import process_anthem_file
+from table_index import TableIndex, build_index, index_path
+
+RECORD = {
+    'reporting_entity_name': 'Entity A', 'reporting_entity_type': 'TPA',
+    'reporting_plans': [{'plan_name': 'Plan', 'plan_id_type': 'EIN', 'plan_id': '123', 'plan_market_type': 'group'}],
+    'in_network_files': [{'description': 'in-network file', 'location': 'https://example.com/a.json.gz'}],
+}
+
+class TestAnthem(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        # Output tables and the quarantine file are written relative to the working directory
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    @patch.object(record_scanner, 'orjson', None)
+    def test_invalid_utf8_record_is_quarantined(self):
+        with open('anthem_index.json', 'wb') as f:
+            f.write(b'[\n')
+            f.write(json.dumps(RECORD).encode() + b',\n')
+            f.write(b'{"reporting_entity_name": "\xff"},\n')
+            f.write(json.dumps(RECORD).encode() + b'\n')
+            f.write(b']\n')
+
+        self.assertTrue(process_anthem_file('anthem_index.json', compression=None))
+        with open('toc_mrf_metadata.csv', newline='') as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 2)
+        with open('quarantine.jsonl') as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['errors'][0]['class'], 'json_decode')
+
+    def test_index_built_while_writing(self):
+        record = dict(RECORD, reporting_entity_name='Entity, "A"')
+        with open('anthem_index.json', 'wb') as f:
+            f.write(b'[\n')
+            for i in range(3):
+                plans = [dict(RECORD['reporting_plans'][0], plan_id=str(i))]
+                f.write(json.dumps(dict(record, reporting_plans=plans)).encode() + b',\n')
+            f.write(b']\n')
+
+        self.assertTrue(process_anthem_file('anthem_index.json', compression=None))
+        with TableIndex('toc_mrf_metadata.csv') as index:
+            rows = index.lookup('plan_id', '1')
+            self.assertEqual([row['reporting_entity_name'] for row in rows], ['Entity, "A"'])
+            self.assertEqual(len(index.lookup('in_network_file_name', 'a.json.gz')), 3)
+        with open(index_path('toc_mrf_metadata.csv', 'plan_id'), 'rb') as f:
+            written = f.read()
+        build_index('toc_mrf_metadata.csv')
+        with open(index_path('toc_mrf_metadata.csv', 'plan_id'), 'rb') as f:
+            self.assertEqual(f.read(), written)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os
+import tempfile
+import threading
+from async_writer import AsyncTableWriter, CsvBatchEncoder
+from toc_metadata_processor import TocMetadataProcessor
+
+class TestAsyncTableWriter(unittest.TestCase):
+
+    def test_batches_are_coalesced_in_order(self):
+        release = threading.Event()
+        writes = []
+
+        def write(data):
+            release.wait()
+            writes.append(data)
+
+        writer = AsyncTableWriter(write, max_pending=100, coalesce_bytes=1024)
+        for i in range(10):
+            writer.put(f'{i}\n'.encode())
+        release.set()
+        writer.close()
+        self.assertEqual(b''.join(writes), b''.join(f'{i}\n'.encode() for i in range(10)))
+        self.assertLess(len(writes), 10)
+
+    def test_checkpoint_flushes_written_data(self):
+        written = []
+        flushed = []
+        writer = AsyncTableWriter(written.append, lambda: flushed.append(len(written)))
+        writer.put(b'a')
+        writer.checkpoint()
+        self.assertEqual(flushed, [1])
+        writer.close()
+        self.assertEqual(len(flushed), 2)
+
+    def test_write_errors_reach_the_producer(self):
+        def write(data):
+            raise OSError("disk full")
+
+        writer = AsyncTableWriter(write, max_pending=1)
+        for _ in range(5):
+            try:
+                writer.put(b'a')
+            except RuntimeError:
+                break
+        with self.assertRaises(RuntimeError):
+            writer.close()
+
+    def test_csv_batch_encoder(self):
+        encoder = CsvBatchEncoder(['a', 'b'])
+        encoder.writeheader()
+        encoder.writerows([{'a': '1', 'b': 'x, y'}])
+        self.assertEqual(encoder.take(), b'a,b\r\n1,"x, y"\r\n')
+        self.assertEqual(encoder.take(), b'')
+
+    def test_processor_grows_mmap_from_writer_thread(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output_file = os.path.join(tmp, 'toc_metadata.csv')
+            processor = TocMetadataProcessor(output_file, 'uhc')
+            processor.mmap_size = 256
+            items = [{'reporting_entity_name': f'Entity {i}',
+                      'in_network_files': [{'location': f'http://x/{i}.json.gz'}]} for i in range(50)]
+            with processor:
+                processor.process_batch(items)
+            with open(output_file, 'rb') as f:
+                lines = f.read().rstrip(b'\0').splitlines()
+            self.assertEqual(len(lines), 51)
+            self.assertTrue(lines[-1].startswith(b'uhc,,Entity 49,'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import os
+import csv
+import gzip
+import tempfile
+from async_writer import CsvBatchEncoder
+from compressed_output import ParallelCompressedWriter, open_binary_output
+
+class TestCompressedOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data = b''.join(f'row-{i},http://example.com/file-{i % 10}.json.gz\n'.encode() for i in range(5000))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_gzip_blocks_form_a_valid_stream(self):
+        path = os.path.join(self.tmp.name, 'out.csv.gz')
+        writer = ParallelCompressedWriter(path, 'gzip', block_size=1000, threads=3)
+        for i in range(0, len(self.data), 777):
+            writer.write(self.data[i:i + 777])
+        writer.close()
+        with gzip.open(path, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_zstd_blocks_form_a_valid_stream(self):
+        try:
+            import zstandard
+        except ImportError:
+            self.skipTest("zstandard not installed")
+        path = os.path.join(self.tmp.name, 'out.csv.zst')
+        with ParallelCompressedWriter(path, 'zstd', block_size=1000, threads=3) as writer:
+            writer.write(self.data)
+        with open(path, 'rb') as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            self.assertEqual(reader.read(), self.data)
+
+    def test_open_binary_output_csv_round_trip(self):
+        path = os.path.join(self.tmp.name, 'toc_metadata.csv')
+        encoder = CsvBatchEncoder(['carrier', 're_name'])
+        encoder.writeheader()
+        encoder.writerows([{'carrier': 'anthem', 're_name': 'Entity, Inc'}])
+        with open_binary_output(path, 'gzip') as f:
+            f.write(encoder.take())
+        with gzip.open(path + '.gz', 'rt', newline='') as f:
+            self.assertEqual(list(csv.reader(f)), [['carrier', 're_name'], ['anthem', 'Entity, Inc']])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,14 +18,14 @@ class TestMain(unittest.TestCase):
             os.remove(os.path.join(self.test_dir, file))
         os.rmdir(self.test_dir)
 
-    @patch('main.webdriver.Chrome')
+    @patch('selenium.webdriver.Chrome')
     def test_setup_chrome_driver(self, mock_chrome):
         driver = setup_chrome_driver()
         self.assertIsNotNone(driver)
         mock_chrome.assert_called_once()
 
     @patch('main.setup_chrome_driver')
-    @patch('main.WebDriverWait')
+    @patch('selenium.webdriver.support.ui.WebDriverWait')
     def test_download_json_files(self, mock_wait, mock_setup_driver):
         mock_driver = MagicMock()
         mock_setup_driver.return_value = mock_driver
@@ -0,0 +1,69 @@
+import unittest
+import os
+import tempfile
+from mrf_dedup import MrfDeduplicator, hash_file
+
+IDENTITIES = {
+    'http://a/1': (100, 'abc'),
+    'http://b/1': (100, 'abc'),
+    'http://a/2': (200, None),
+    'http://b/2': (200, None),
+    'http://c/2': (200, None),
+    'http://a/3': (300, None),
+    'http://a/4': (None, None),
+}
+CONTENTS = {'http://a/2': b'same', 'http://b/2': b'same', 'http://c/2': b'other'}
+
+class TestMrfDeduplicator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_dedupe(self):
+        jobs = [{'file_name': url.replace('/', '_'), 'url': url, 'size': 0} for url in IDENTITIES]
+        deduplicator = MrfDeduplicator(max_threads=2, bytes_per_second=100, probe=IDENTITIES.get)
+        to_download = deduplicator.dedupe(jobs)
+
+        # Same-size files without an ETag are all downloaded, flagged for hashing
+        self.assertEqual(len(to_download), 6)
+        self.assertEqual(sorted(job['url'] for job in to_download if job.get('verify_hash')),
+                         ['http://a/2', 'http://b/2', 'http://c/2'])
+        self.assertEqual(deduplicator.links['http://b/1']['canonical_file_location'], 'http://a/1')
+        # Only the skipped ETag duplicate counts as saved
+        self.assertEqual(deduplicator.report['bytes_saved'], 100)
+        self.assertEqual(deduplicator.report['estimated_download_seconds_saved'], 1)
+        self.assertEqual((deduplicator.report['parses_avoided'], deduplicator.report['bytes_not_parsed']), (1, 100))
+
+        results = []
+        for job in to_download:
+            path = os.path.join(self.tmp.name, job['file_name'])
+            with open(path, 'wb') as f:
+                f.write(CONTENTS.get(job['url'], b'x'))
+            results.append({'file_name': job['file_name'], 'url': job['url'], 'file_path': path, 'bytes': 200})
+        remaining = deduplicator.resolve_downloads(results)
+
+        self.assertEqual(len(remaining), 5)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'http:__b_2')))
+        self.assertEqual(deduplicator.links['http://b/2']['canonical_file_name'], 'http:__a_2')
+        self.assertEqual(deduplicator.links['http://c/2']['canonical_file_name'], 'http:__c_2')
+        report = deduplicator.report
+        self.assertEqual((report['unique_files'], report['duplicates']), (5, 2))
+        self.assertEqual(report['duplicate_bytes_downloaded'], 200)
+        self.assertEqual(report['bytes_saved'], 100)
+        # Hash duplicates were downloaded but are still parses avoided
+        self.assertEqual((report['parses_avoided'], report['bytes_not_parsed']), (2, 300))
+        parsed = [dict(result, parse_seconds=1.0) for result in remaining]
+        self.assertEqual(deduplicator.estimate_parse_savings(parsed), 1.5)
+        self.assertIsNone(deduplicator.estimate_parse_savings(remaining))
+
+    def test_hash_file(self):
+        path = os.path.join(self.tmp.name, 'f.json')
+        with open(path, 'wb') as f:
+            f.write(b'abc')
+        self.assertEqual(hash_file(path), 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad')
+
+if __name__ == '__main__':
+    unittest.main()
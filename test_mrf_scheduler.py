@@ -0,0 +1,105 @@
+import unittest
+import os
+import gzip
+import json
+import tempfile
+from unittest.mock import patch
+import config
+from output_tables import iter_csv_rows
+import mrf_scheduler
+from mrf_scheduler import load_jobs, order_jobs, projected_makespan, parse_mrf, MrfJobScheduler
+
+def echo_job(job):
+    return {'file_name': job['file_name']}
+
+class TestMrfScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.metadata_csv = os.path.join(self.tmp.name, 'toc_mrf_metadata.csv')
+        self.size_csv = os.path.join(self.tmp.name, 'toc_mrf_size_data.csv')
+        with open(self.metadata_csv, 'w') as f:
+            f.write('in_network_file_name,in_network_file_location,plan_id\n')
+            f.write('a.json.gz,http://example.com/a.json.gz,1\n')
+            f.write('b.json.gz,http://example.com/b.json.gz,1\n')
+            f.write('a.json.gz,http://example.com/a.json.gz,2\n')
+            f.write('c.json.gz,http://example.com/c.json.gz,2\n')
+        with open(self.size_csv, 'wb') as f:
+            f.write(b'in_network_file_name,in_network_file_size,remarks,carrier,batch\n')
+            f.write(b'a.json.gz,100,,uhc,2024-10\n')
+            f.write(b'b.json.gz,900,,uhc,2024-10\n')
+            f.write(b'c.json.gz,,Content-Length not available in headers,uhc,2024-10\n')
+            f.write(b'\0' * 64)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_load_and_order_jobs(self):
+        jobs = load_jobs(self.metadata_csv, self.size_csv)
+        self.assertEqual(len(jobs), 3)
+        ordered = order_jobs(jobs)
+        self.assertEqual([job['file_name'] for job in ordered], ['b.json.gz', 'c.json.gz', 'a.json.gz'])
+        # Unknown sizes fall back to the mean of the known ones
+        self.assertEqual(ordered[1]['size'], 500)
+        self.assertFalse(ordered[1]['size_known'])
+
+    def test_same_file_name_under_different_urls(self):
+        with open(self.metadata_csv, 'a') as f:
+            f.write('a.json.gz,http://mirror.example.com/a.json.gz,3\n')
+        jobs = {job['url']: job for job in load_jobs(self.metadata_csv, self.size_csv)}
+        self.assertEqual(len(jobs), 4)
+        first = jobs['http://example.com/a.json.gz']['local_name']
+        second = jobs['http://mirror.example.com/a.json.gz']['local_name']
+        self.assertNotEqual(first, second)
+        self.assertTrue(first.endswith('_a.json.gz') and second.endswith('_a.json.gz'))
+        self.assertEqual(jobs['http://example.com/b.json.gz']['local_name'], 'b.json.gz')
+
+    def test_csv_rows_stop_at_padding(self):
+        with open(self.size_csv, 'wb') as f:
+            f.write(b'in_network_file_name,in_network_file_size\n')
+            f.write(b'"a, b.json.gz",100\n')
+            # The padding contains no newline and may follow a row without one
+            f.write(b'd.json.gz,5' + b'\0' * (1024 * 1024))
+        rows = list(iter_csv_rows(self.size_csv))
+        self.assertEqual(rows, [{'in_network_file_name': 'a, b.json.gz', 'in_network_file_size': '100'},
+                                {'in_network_file_name': 'd.json.gz', 'in_network_file_size': '5'}])
+
+    def test_parse_mrf(self):
+        mrf_path = os.path.join(self.tmp.name, 'a.json.gz')
+        with gzip.open(mrf_path, 'wt') as f:
+            json.dump({'in_network': [{'billing_code': '1', 'negotiated_rates': [{'provider_references': [7]}]}],
+                       'provider_references': [{'provider_group_id': 7, 'provider_groups': [{'npi': [1]}]}]}, f)
+        job = {'file_name': 'a.json.gz', 'url': 'http://example.com/a.json.gz', 'local_name': 'a.json.gz',
+               'file_path': mrf_path}
+        with patch.object(config, 'PARSED_DIR', os.path.join(self.tmp.name, 'parsed')):
+            result = parse_mrf(job)
+        self.assertEqual(result['parsed_path'], os.path.join(self.tmp.name, 'parsed', 'a.jsonl'))
+        self.assertEqual(result['items'], 1)
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, 'parsed')), ['a.jsonl'])
+        with open(result['parsed_path']) as f:
+            item = json.loads(f.readline())
+        self.assertEqual(item['negotiated_rates'][0]['provider_groups'], [{'npi': [1]}])
+
+    def test_verify_hash_jobs_are_not_parsed_before_dedup(self):
+        job = {'file_name': 'a.json.gz', 'url': 'http://example.com/a.json.gz', 'local_name': 'a.json.gz'}
+        downloaded = dict(job, file_path='downloads/a.json.gz', bytes=10)
+        with patch.object(mrf_scheduler, 'download_mrf', return_value=downloaded), \
+                patch.object(mrf_scheduler, 'parse_mrf', return_value={'parsed_path': 'parsed/a.jsonl'}) as parse:
+            self.assertNotIn('parsed_path', mrf_scheduler.download_and_parse_mrf(dict(job, verify_hash=True)))
+            parse.assert_not_called()
+            self.assertEqual(mrf_scheduler.download_and_parse_mrf(job)['parsed_path'], 'parsed/a.jsonl')
+
+    def test_projected_makespan(self):
+        self.assertEqual(projected_makespan([7, 5, 4, 3, 1], workers=2, bytes_per_second=1), 10)
+
+    def test_run_reports_makespan(self):
+        jobs = load_jobs(self.metadata_csv, self.size_csv)
+        scheduler = MrfJobScheduler(job_fn=echo_job, max_workers=2)
+        results = scheduler.run(jobs)
+        self.assertEqual(sorted(r['file_name'] for r in results), ['a.json.gz', 'b.json.gz', 'c.json.gz'])
+        self.assertEqual(scheduler.report['jobs'], 3)
+        self.assertEqual(scheduler.report['failed'], 0)
+        self.assertGreater(scheduler.report['actual_makespan'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import os
+import json
+import tempfile
+import tracemalloc
+from provider_reference_index import ProviderReferenceIndex
+
+class TestProviderReferenceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mrf_file = os.path.join(self.tmp.name, 'in_network.json')
+        # provider_references deliberately come after in_network
+        mrf = {
+            'reporting_entity_name': 'Test Entity',
+            'in_network': [
+                {'billing_code': '99213', 'negotiated_rates': [
+                    {'provider_references': [1, 2, 99], 'negotiated_prices': [{'negotiated_rate': 10.5}]}
+                ]},
+                {'billing_code': '99214', 'negotiated_rates': [
+                    {'provider_references': [2], 'negotiated_prices': [{'negotiated_rate': 20.0}]}
+                ]},
+            ],
+            'provider_references': [
+                {'provider_group_id': 1, 'provider_groups': [{'npi': [111], 'tin': {'type': 'ein', 'value': '1'}}]},
+                {'provider_group_id': 2, 'provider_groups': [{'npi': [222], 'tin': {'type': 'ein', 'value': '2'}}]},
+            ]
+        }
+        with open(self.mrf_file, 'w') as f:
+            json.dump(mrf, f)
+        self.db_path = os.path.join(self.tmp.name, 'refs.db')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_build_and_resolve(self):
+        with ProviderReferenceIndex(self.db_path, memory_limit_mb=1) as index:
+            self.assertEqual(index.build(self.mrf_file), 2)
+            items = list(index.resolve_in_network(self.mrf_file))
+
+            first_rate = items[0]['negotiated_rates'][0]
+            self.assertNotIn('provider_references', first_rate)
+            self.assertEqual([g['npi'] for g in first_rate['provider_groups']], [[111], [222]])
+            self.assertEqual(index.unresolved, 1)
+            # Second lookup of reference 2 is served from the LRU cache
+            self.assertEqual(index.stats()['hits'], 1)
+
+    def test_references_do_not_carry_over_between_mrfs(self):
+        other_mrf = os.path.join(self.tmp.name, 'other.json')
+        with open(other_mrf, 'w') as f:
+            json.dump({
+                'in_network': [{'billing_code': '99215', 'negotiated_rates': [{'provider_references': [1, 2]}]}],
+                'provider_references': [{'provider_group_id': 1, 'provider_groups': [{'npi': [333]}]}],
+            }, f)
+        with ProviderReferenceIndex(self.db_path, memory_limit_mb=1) as index:
+            index.build(self.mrf_file)
+            # Reference 2 is now in both the SQLite store and the LRU cache
+            index.lookup(2)
+            self.assertEqual(index.build(other_mrf), 1)
+            rate = next(index.resolve_in_network(other_mrf))['negotiated_rates'][0]
+            self.assertEqual([g['npi'] for g in rate['provider_groups']], [[333]])
+            self.assertIsNone(index.lookup(2))
+            self.assertEqual(index.unresolved, 1)
+
+    def test_references_in_separate_files(self):
+        ref_dir = os.path.join(self.tmp.name, 'refs')
+        os.makedirs(ref_dir)
+        # CMS layout: the reference file has provider_groups and version but no id
+        for name, npi in (('ref3.json', 333), ('ref4.json', 444)):
+            with open(os.path.join(ref_dir, name), 'w') as f:
+                json.dump({'version': '1.0.0', 'provider_groups': [{'npi': [npi]}]}, f)
+        with open(self.mrf_file, 'w') as f:
+            json.dump({
+                'in_network': [{'billing_code': '99213', 'negotiated_rates': [{'provider_references': [1, 3, 4, 5]}]}],
+                'provider_references': [
+                    {'provider_group_id': 1, 'provider_groups': [{'npi': [111]}]},
+                    {'provider_group_id': 3, 'location': os.path.join(ref_dir, 'ref3.json')},
+                    {'provider_group_id': 4, 'location': 'https://example.com/refs/ref4.json?sig=abc'},
+                    {'provider_group_id': 5, 'location': 'https://example.com/refs/missing.json'},
+                ],
+            }, f)
+
+        fetched = []
+
+        def fetch(location):
+            fetched.append(location)
+            return None if location.startswith('https://') else json.load(open(location))
+
+        with ProviderReferenceIndex(self.db_path, memory_limit_mb=1, fetch_reference=fetch) as index:
+            index.build(self.mrf_file, resolve_locations=False)
+            # A local copy is matched to its reference by file name
+            self.assertEqual(index.build_from_reference_file(os.path.join(ref_dir, 'ref4.json')), 1)
+            self.assertEqual(index.resolve_locations(), 1)
+            self.assertEqual(sorted(fetched), [os.path.join(ref_dir, 'ref3.json'),
+                                               'https://example.com/refs/missing.json'])
+            rate = next(index.resolve_in_network(self.mrf_file))['negotiated_rates'][0]
+            self.assertEqual([g['npi'] for g in rate['provider_groups']], [[111], [333], [444]])
+            self.assertEqual(index.unresolved, 1)
+
+    def test_cache_memory_stays_within_limit(self):
+        refs = [{'provider_group_id': i, 'provider_groups': [{'npi': [1000000000 + i, 1000000001 + i],
+                                                               'tin': {'type': 'ein', 'value': f'{i:09d}'}}]}
+                for i in range(5000)]
+        with open(self.mrf_file, 'w') as f:
+            json.dump({'in_network': [], 'provider_references': refs}, f)
+        with ProviderReferenceIndex(self.db_path, memory_limit_mb=1) as index:
+            index.build(self.mrf_file)
+            tracemalloc.start()
+            try:
+                before = tracemalloc.get_traced_memory()[0]
+                for i in range(5000):
+                    index.lookup(i)
+                cache_memory = tracemalloc.get_traced_memory()[0] - before
+            finally:
+                tracemalloc.stop()
+            self.assertLessEqual(index.cache_bytes, index.cache_limit)
+            self.assertGreater(len(index.cache), 1000)
+            # The counted size must track the real allocation, not just the payload length
+            self.assertLess(cache_memory, index.cache_limit * 1.25)
+
+    def test_cache_respects_memory_limit(self):
+        with ProviderReferenceIndex(self.db_path, memory_limit_mb=1) as index:
+            index.build(self.mrf_file)
+            index.cache_limit = 400
+            index.lookup(1)
+            index.lookup(2)
+            self.assertLessEqual(index.cache_bytes, 400)
+            self.assertEqual(list(index.cache), ['2'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import os
+import json
+import tempfile
+from unittest import mock
+import record_scanner
+from record_scanner import RecordScanner, ReadlineScanner, decode_record, open_records
+
+class TestRecordScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp.name, 'index.json')
+        with open(self.file_path, 'wb') as f:
+            f.write(b'[\n  {"a": 1},\r\n{"b": "x,y"},\n\n  {"c": [1, 2]}  \n]\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_records_are_trimmed_and_decoded(self):
+        with RecordScanner(self.file_path) as scanner:
+            raw = [bytes(record) for record in scanner]
+        self.assertEqual(raw, [b'{"a": 1}', b'{"b": "x,y"}', b'{"c": [1, 2]}'])
+
+        with RecordScanner(self.file_path) as scanner:
+            objects = [decode_record(record) for record in scanner]
+        self.assertEqual(objects, [{'a': 1}, {'b': 'x,y'}, {'c': [1, 2]}])
+        self.assertEqual(scanner.position, os.path.getsize(self.file_path))
+
+    def test_windows_and_offsets(self):
+        with open(self.file_path, 'rb') as f:
+            data = f.read()
+        expected = [(b'{"a": 1}', 2), (b'{"b": "x,y"}', 15), (b'{"c": [1, 2]}', 30)]
+        # Windows smaller than a record still yield whole lines
+        for window_size in (1, 5, 16, 1024):
+            with RecordScanner(self.file_path, window_size) as scanner:
+                records = [(record, scanner.record_start) for record in scanner]
+                self.assertEqual(records, expected)
+                self.assertEqual(scanner.position, len(data))
+        with ReadlineScanner(self.file_path) as scanner:
+            self.assertEqual([(record, scanner.record_start) for record in scanner], expected)
+
+    def test_readline_loop_without_orjson(self):
+        with mock.patch.object(record_scanner, 'orjson', None):
+            with open_records(self.file_path) as scanner:
+                self.assertIsInstance(scanner, ReadlineScanner)
+                self.assertEqual([decode_record(record) for record in scanner], [{'a': 1}, {'b': 'x,y'}, {'c': [1, 2]}])
+
+    def test_invalid_record_raises_json_error(self):
+        with open(self.file_path, 'wb') as f:
+            f.write(b'[\n{"a": 1,\n]\n')
+        with RecordScanner(self.file_path) as scanner:
+            with self.assertRaises(json.JSONDecodeError):
+                for record in scanner:
+                    decode_record(record)
+
+    def test_abandoned_iteration_can_be_closed(self):
+        scanner = RecordScanner(self.file_path)
+        record = next(iter(scanner))
+        self.assertEqual(bytes(record), b'{"a": 1}')
+        scanner.close()
+        self.assertIsNone(scanner.mmap_file)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import os
+import json
+import tempfile
+from record_validator import RecordValidator, check_required, check_schema
+
+VALID = {
+    'reporting_entity_name': 'Entity A',
+    'reporting_plans': [{'plan_name': 'Plan', 'plan_id_type': 'EIN', 'plan_id': '123', 'plan_market_type': 'group'}],
+    'in_network_files': [{'description': 'in-network file', 'location': 'https://example.com/a.json.gz'}],
+}
+
+class TestRecordValidator(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.quarantine_file = os.path.join(self.tmp.name, 'quarantine.jsonl')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_checks(self):
+        self.assertEqual(check_required(VALID), [])
+        self.assertEqual(check_schema(VALID), [])
+        self.assertEqual(check_required([]), [('type:record', 'list')])
+        self.assertEqual(check_required({}), [('missing_key:reporting_entity_name', ''),
+                                              ('missing_key:reporting_plans', ''),
+                                              ('missing_key:in_network_files', '')])
+        self.assertEqual(check_required(dict(VALID, reporting_entity_name=7)), [('type:reporting_entity_name', 'int')])
+        self.assertEqual(check_required(dict(VALID, reporting_plans={})), [('type:reporting_plans', 'dict')])
+        self.assertEqual(check_required(dict(VALID, reporting_plans=[])), [('empty:reporting_plans', '')])
+        allowed_amount_only = {key: value for key, value in VALID.items() if key != 'in_network_files'}
+        self.assertEqual(check_required(dict(allowed_amount_only, allowed_amount_file=VALID['in_network_files'][0])), [])
+        self.assertEqual(check_required(allowed_amount_only), [('missing_key:in_network_files', '')])
+        bad_plan = dict(VALID, reporting_plans=[dict(VALID['reporting_plans'][0], plan_market_type='retail')])
+        self.assertEqual(check_required(bad_plan), [])
+        self.assertEqual([e[0] for e in check_schema(bad_plan)], ['schema:reporting_plans.plan_market_type'])
+
+    def test_sampled_schema_errors_are_counted_but_not_rejected(self):
+        bad_location = dict(VALID, in_network_files=[{'description': 'd', 'location': 'ftp://x'}])
+        with RecordValidator(sample_rate=0.5, quarantine_file=self.quarantine_file) as validator:
+            results = [validator.validate(bad_location, b'{...}', i) for i in range(4)]
+        self.assertEqual(results, [True] * 4)
+        self.assertEqual(validator.records_sampled, 2)
+        self.assertEqual(validator.error_counts['schema:in_network_files.location'], 2)
+
+    def test_rejections_and_bounded_quarantine(self):
+        with RecordValidator(sample_rate=0, quarantine_file=self.quarantine_file,
+                             max_quarantined=2, max_record_bytes=5) as validator:
+            self.assertFalse(validator.validate(dict(VALID, in_network_files='x'), memoryview(b'{"in_network_files": "x"}'), 10))
+            validator.record_error('json_decode', 'Expecting value', b'{bad', 20)
+            validator.record_error('json_decode', 'Expecting value', b'{bad', 30)
+            self.assertTrue(validator.validate(VALID))
+        summary = validator.summary()
+        self.assertEqual(summary['records_rejected'], 3)
+        self.assertEqual(summary['error_counts'], {'json_decode': 2, 'type:in_network_files': 1})
+        with open(self.quarantine_file) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]['record'], '{"in_')
+        self.assertEqual(entries[0]['position'], 10)
+        self.assertEqual(entries[1]['errors'], [{'class': 'json_decode', 'detail': 'Expecting value'}])
+
+    def test_clean_run_removes_previous_quarantine(self):
+        with open(self.quarantine_file, 'w') as f:
+            f.write('{"errors": [], "position": 0, "record": "old"}\n')
+        with RecordValidator(quarantine_file=self.quarantine_file) as validator:
+            self.assertTrue(validator.validate(VALID))
+        self.assertFalse(os.path.exists(self.quarantine_file))
+
+if __name__ == '__main__':
+    unittest.main()
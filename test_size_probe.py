@@ -0,0 +1,149 @@
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+import socket
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from size_probe import SizeProbe, HostState
+import config
+import toc_mrf_size_processor
+from toc_mrf_size_processor import TocMrfSizeProcessor
+from output_tables import iter_csv_rows
+
+class ProbeHandler(BaseHTTPRequestHandler):
+    """Simulates the HEAD/GET behaviours of the hosts serving MRFs"""
+    throttled_requests = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        if self.path == '/ok':
+            self._send(200, {'Content-Length': '1234'})
+        elif self.path in ('/signed', '/ignores-range'):
+            self._send(403, {'Content-Length': '0'})
+        elif self.path == '/chunked':
+            self._send(200, {'Transfer-Encoding': 'chunked'})
+        elif self.path == '/always-throttled':
+            self._send(429, {'Retry-After': '30', 'Content-Length': '0'})
+        elif self.path == '/throttled':
+            with ProbeHandler.lock:
+                ProbeHandler.throttled_requests += 1
+                throttle = ProbeHandler.throttled_requests <= 2
+            if throttle:
+                self._send(429, {'Retry-After': '0', 'Content-Length': '0'})
+            else:
+                self._send(200, {'Content-Length': '42'})
+        else:
+            self._send(404, {'Content-Length': '0'})
+
+    def do_GET(self):
+        if self.path in ('/signed', '/chunked') and self.headers.get('Range') == 'bytes=0-0':
+            self._send(206, {'Content-Range': 'bytes 0-0/5000', 'Content-Length': '1'})
+            self.wfile.write(b'{')
+        elif self.path == '/ignores-range':
+            self._send(200, {'Content-Length': '3'})
+            self.wfile.write(b'{}\n')
+        else:
+            self._send(404, {'Content-Length': '0'})
+
+class TestSizeProbe(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), ProbeHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        ProbeHandler.throttled_requests = 0
+        self.probe = SizeProbe(timeout=2, max_backoff=0)
+
+    def test_head_content_length(self):
+        self.assertEqual(self.probe.probe(f"{self.base_url}/ok"), (1234, ''))
+
+    def test_rejected_head_falls_back_to_ranged_get(self):
+        self.assertEqual(self.probe.probe(f"{self.base_url}/signed"), (5000, 'Size from ranged GET'))
+
+    def test_chunked_head_falls_back_to_ranged_get(self):
+        self.assertEqual(self.probe.probe(f"{self.base_url}/chunked"), (5000, 'Size from ranged GET'))
+
+    def test_get_without_range_support(self):
+        self.assertEqual(self.probe.probe(f"{self.base_url}/ignores-range"), (3, 'Size from GET'))
+
+    def test_missing_file(self):
+        size, remarks = self.probe.probe(f"{self.base_url}/missing")
+        self.assertIsNone(size)
+        self.assertEqual(remarks, 'Size not available (HEAD 404, GET 404)')
+
+    def test_throttling_halves_concurrency_and_retries(self):
+        size, _ = self.probe.probe(f"{self.base_url}/throttled")
+        self.assertEqual(size, 42)
+        state = self.probe.host_state(self.base_url.split('//')[1])
+        self.assertLess(state.limit, 4)
+        self.assertEqual(ProbeHandler.throttled_requests, 3)
+
+    def test_no_backoff_after_last_attempt(self):
+        probe = SizeProbe(timeout=2, max_retries=0, max_backoff=30)
+        start_time = time.monotonic()
+        size, remarks = probe.probe(f"{self.base_url}/always-throttled")
+        self.assertIsNone(size)
+        self.assertEqual(remarks, 'Error: HEAD throttled (429) after 1 attempts')
+        self.assertLess(time.monotonic() - start_time, 5)
+
+    def test_circuit_opens_for_unreachable_host(self):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        probe = SizeProbe(timeout=1, host_state_factory=lambda: HostState(failure_threshold=2, cooldown=60))
+        url = f"http://127.0.0.1:{port}/file.json.gz"
+        for _ in range(2):
+            size, remarks = probe.probe(url)
+            self.assertIsNone(size)
+            self.assertTrue(remarks.startswith('Error: '))
+        size, remarks = probe.probe(url)
+        self.assertIn('circuit open', remarks)
+
+    def test_processors_share_one_configured_probe(self):
+        items = [{'in_network_files': [{'location': f"{self.base_url}/ok"}, {'location': f"{self.base_url}/missing"}]}]
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(config, 'SIZE_PROBE_HOST_TIMEOUTS', {'127.0.0.1': 2}), \
+                mock.patch.object(toc_mrf_size_processor, '_size_probe', None):
+            probes = []
+            for name in ('a.csv', 'b.csv'):
+                processor = TocMrfSizeProcessor(os.path.join(tmp, name), 'anthem')
+                processor.mmap_size = 4096
+                with processor:
+                    processor.process_batch(items)
+                probes.append(toc_mrf_size_processor._size_probe)
+                rows = {row['in_network_file_name']: row['in_network_file_size']
+                        for row in iter_csv_rows(os.path.join(tmp, name))}
+                self.assertEqual(rows, {'ok': '1234', 'missing': ''})
+        self.assertIs(probes[0], probes[1])
+        self.assertEqual(probes[0].host_timeouts, {'127.0.0.1': 2})
+
+    def test_token_bucket_limits_rate(self):
+        state = HostState(rate=1000, burst=2, initial_concurrency=10)
+        for _ in range(2):
+            state.acquire()
+        self.assertLess(state.tokens, 1)
+        state.acquire()
+        self.assertEqual(state.in_flight, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import os
+import tempfile
+from toc_mrf_metadata_processor import TocMrfMetadataProcessor
+from table_index import TableIndex, TableIndexWriter, build_index, index_path, iter_records, parse_record
+
+class TestTableIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.table = os.path.join(self.tmp.name, 'toc_mrf_metadata.csv')
+        self.items = [
+            {'reporting_entity_name': 'Entity A', 'reporting_entity_type': 'TPA',
+             'in_network_files': [{'location': 'http://x/a.json.gz'}, {'location': 'http://x/shared.json.gz'}],
+             'reporting_plans': [{'plan_name': 'Plan 1', 'plan_id': '111'}]},
+            {'reporting_entity_name': 'Entity B', 'reporting_entity_type': 'TPA',
+             'in_network_files': [{'location': 'http://x/shared.json.gz'}],
+             'reporting_plans': [{'plan_name': 'Plan 2', 'plan_id': '222'}, {'plan_name': 'Plan 3', 'plan_id': '333'}]},
+        ]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write_table(self):
+        processor = TocMrfMetadataProcessor(self.table, 'uhc')
+        processor.mmap_size = 4096
+        with processor:
+            processor.process_batch(self.items)
+
+    def test_index_built_at_write_time(self):
+        self._write_table()
+        with TableIndex(self.table) as index:
+            plans = index.lookup('in_network_file_name', 'shared.json.gz')
+            self.assertEqual(sorted(row['plan_id'] for row in plans), ['111', '222', '333'])
+            files = index.lookup('plan_id', '111')
+            self.assertEqual(sorted(row['in_network_file_name'] for row in files), ['a.json.gz', 'shared.json.gz'])
+            self.assertEqual(len(index.lookup('reporting_entity_name', 'Entity B')), 2)
+            self.assertEqual(index.lookup('plan_id', 'missing'), [])
+
+    def test_lookup_rows_with_commas_and_quotes(self):
+        self.items = [
+            {'reporting_entity_name': 'United HealthCare Services, Inc.', 'reporting_entity_type': 'TPA',
+             'in_network_files': [{'location': 'http://x/c.json.gz', 'description': 'PPO, "national"'}],
+             'reporting_plans': [{'plan_name': 'Plan "A", Gold', 'plan_id': '444'}]},
+        ]
+        for build_index_flag in (True, False):
+            processor = TocMrfMetadataProcessor(self.table, 'uhc', build_index=build_index_flag)
+            processor.mmap_size = 4096
+            with processor:
+                processor.process_batch(self.items)
+        # The second pass wrote the same table without an index; rebuild it from the file
+        build_index(self.table)
+        with TableIndex(self.table) as index:
+            for column, value in (('plan_id', '444'),
+                                  ('reporting_entity_name', 'United HealthCare Services, Inc.'),
+                                  ('in_network_file_name', 'c.json.gz')):
+                rows = index.lookup(column, value)
+                self.assertEqual(len(rows), 1)
+                self.assertEqual(rows[0]['in_network_file_description'], 'PPO, "national"')
+                self.assertEqual(rows[0]['plan_name'], 'Plan "A", Gold')
+
+    def test_rewritten_table_invalidates_index(self):
+        self._write_table()
+        self.assertTrue(os.path.exists(index_path(self.table, 'plan_id')))
+        # Rewriting the table without indexing removes the old index files
+        processor = TocMrfMetadataProcessor(self.table, 'uhc', build_index=False)
+        processor.mmap_size = 4096
+        with processor:
+            processor.process_batch(self.items[:1])
+        self.assertFalse(os.path.exists(index_path(self.table, 'plan_id')))
+
+        # An index left over from a different table is rejected, not followed
+        self._write_table()
+        with open(index_path(self.table, 'plan_id'), 'rb') as f:
+            old_index = f.read()
+        with open(self.table, 'w') as f:
+            f.write('plan_id\n1\n')
+        with open(index_path(self.table, 'plan_id'), 'wb') as f:
+            f.write(old_index)
+        with TableIndex(self.table) as index:
+            with self.assertRaisesRegex(ValueError, 'stale'):
+                index.lookup('plan_id', '333')
+            with self.assertRaisesRegex(ValueError, 'past the end'):
+                index.row_at(10 ** 6)
+
+    def test_build_index_matches_write_time_index(self):
+        self._write_table()
+        with open(index_path(self.table, 'plan_id'), 'rb') as f:
+            written = f.read()
+        writer = build_index(self.table)
+        self.assertEqual(writer.total_entries, 4)
+        with open(index_path(self.table, 'plan_id'), 'rb') as f:
+            self.assertEqual(f.read(), written)
+
+    def test_spilled_runs_are_merged(self):
+        with open(self.table, 'w', newline='') as f:
+            f.write('plan_id,plan_name\n')
+            for i in range(50):
+                f.write(f'{i % 7},"Plan, {i}"\n')
+        writer = TableIndexWriter(self.table, ['plan_id', 'plan_name'], run_size=8)
+        with open(self.table, 'rb') as f:
+            data = f.read()
+        records = iter_records(data)
+        next(records)
+        for offset, record in records:
+            writer.add(dict(zip(['plan_id', 'plan_name'], parse_record(record))), offset)
+        writer.finalize()
+        self.assertEqual(os.listdir(self.tmp.name).count('toc_mrf_metadata.csv.plan_id.idx'), 1)
+        self.assertFalse(any('.run' in name for name in os.listdir(self.tmp.name)))
+        with TableIndex(self.table) as index:
+            rows = index.lookup('plan_id', '3')
+            self.assertEqual(len(rows), 7)
+            self.assertTrue(all(row['plan_name'].startswith('Plan, ') for row in rows))
+
+if __name__ == '__main__':
+    unittest.main()
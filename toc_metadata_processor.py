@@ -5,7 +5,7 @@ from urllib.parse import urlparse, parse_qs
 import logging
 from contextlib import contextmanager
 import mmap
-import numpy as np
+from async_writer import AsyncTableWriter
 
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
@@ -28,6 +28,7 @@ class TocMetadataProcessor:
         self.batch_size = 100000
         self.total_rows_written = 0
         self.mmap_file = None
+        self.writer = None
         self.mmap_size = 1024 * 1024 * 1024  # 1GB initial size
 
     def __enter__(self):
@@ -42,6 +43,8 @@ class TocMetadataProcessor:
             f.write(b'\0' * self.mmap_size)
         self.mmap_file = mmap.mmap(os.open(self.output_file, os.O_RDWR), self.mmap_size)
         self._write_header()
+        self.writer = AsyncTableWriter(self._write_encoded, self._flush_mmap_file,
+                                       name=f"writer-{os.path.basename(self.output_file)}")
 
     def _write_header(self):
         header = ','.join(self.fieldnames) + '\n'
@@ -50,19 +53,28 @@ class TocMetadataProcessor:
     def _write_batch(self):
         batch_data = '\n'.join(','.join(str(row.get(field, '')) for field in self.fieldnames) for row in self.batch) + '\n'
         encoded_data = batch_data.encode()
-        if self.mmap_file.tell() + len(encoded_data) > self.mmap_size:
-            self._resize_mmap_file()
-        self.mmap_file.write(encoded_data)
+        self.writer.put(encoded_data)
         self.total_rows_written += len(self.batch)
         self.batch.clear()
 
-    def _resize_mmap_file(self):
-        self.mmap_size *= 2
+    def _write_encoded(self, encoded_data: bytes):
+        # Runs on the writer thread
+        if self.mmap_file.tell() + len(encoded_data) > self.mmap_size:
+            self._resize_mmap_file(self.mmap_file.tell() + len(encoded_data))
+        self.mmap_file.write(encoded_data)
+
+    def _flush_mmap_file(self):
+        self.mmap_file.flush()
+
+    def _resize_mmap_file(self, required_size: int):
+        position = self.mmap_file.tell()
+        while self.mmap_size < required_size:
+            self.mmap_size *= 2
         self.mmap_file.close()
-        with open(self.output_file, 'ab') as f:
-            f.write(b'\0' * self.mmap_size)
+        with open(self.output_file, 'r+b') as f:
+            f.truncate(self.mmap_size)
         self.mmap_file = mmap.mmap(os.open(self.output_file, os.O_RDWR), self.mmap_size)
-        self.mmap_file.seek(0, 2)  # Move to the end of the file
+        self.mmap_file.seek(position)
 
     def process_batch(self, items):
         for item in items:
@@ -97,8 +109,9 @@ class TocMetadataProcessor:
     def finalize(self):
         if self.batch:
             self._write_batch()
+        if self.writer:
+            self.writer.close()
         if self.mmap_file:
-            self.mmap_file.flush()
             self.mmap_file.close()
         logger.info(f"Completed processing toc_metadata: {self.reporting_structure_index} structures processed, {self.total_rows_written} total rows written")
 
@@ -1,4 +1,5 @@
 import os
+import io
 import csv
 from datetime import datetime
 from urllib.parse import urlparse, parse_qs
@@ -6,6 +7,9 @@ from typing import Dict, List
 import logging
 from contextlib import contextmanager
 import mmap
+from async_writer import AsyncTableWriter
+import config
+from table_index import TableIndexWriter, remove_index
 
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
@@ -19,7 +23,7 @@ def extract_filename_from_url(url):
         return os.path.basename(parsed_url.path) or "Unknown"
 
 class TocMrfMetadataProcessor:
-    def __init__(self, output_file: str, carrier: str):
+    def __init__(self, output_file: str, carrier: str, build_index: bool = config.BUILD_TABLE_INDEX):
         self.output_file = output_file
         self.carrier = carrier
         self.fieldnames = ['reporting_entity_name', 'reporting_entity_type', 'reporting_structure', 'in_network_file_name', 'in_network_file_location', 'in_network_file_description', 'allowed_amount_file_name', 'allowed_amount_file_location', 'allowed_amount_file_description', 'plan_name', 'plan_id_type', 'plan_id', 'plan_market_type', 'toc_source_file_name', 'parsed_date', 'carrier', 'batch']
@@ -27,7 +31,13 @@ class TocMrfMetadataProcessor:
         self.batch_size = 100000
         self.total_rows_written = 0
         self.mmap_file = None
+        self.writer = None
+        self.write_offset = 0
         self.mmap_size = 1024 * 1024 * 1024  # 1GB initial size
+        self.index_writer = TableIndexWriter(output_file, self.fieldnames) if build_index else None
+        # Rows go through csv.writer so fields with commas, quotes or newlines are quoted
+        self.row_buffer = io.StringIO()
+        self.row_writer = csv.writer(self.row_buffer, lineterminator='\n')
 
     def __enter__(self):
         self._create_mmap_file()
@@ -37,31 +47,75 @@ class TocMrfMetadataProcessor:
         self.finalize()
 
     def _create_mmap_file(self):
+        # Indexes of a previous table would point into the new one
+        remove_index(self.output_file)
         with open(self.output_file, 'wb') as f:
             f.write(b'\0' * self.mmap_size)
         self.mmap_file = mmap.mmap(os.open(self.output_file, os.O_RDWR), self.mmap_size)
         self._write_header()
+        self.writer = AsyncTableWriter(self._write_encoded, self._flush_mmap_file,
+                                       name=f"writer-{os.path.basename(self.output_file)}")
 
     def _write_header(self):
-        header = ','.join(self.fieldnames) + '\n'
-        self.mmap_file.write(header.encode())
+        header = (','.join(self.fieldnames) + '\n').encode()
+        self.mmap_file.write(header)
+        self.write_offset = len(header)
 
     def _write_batch(self):
-        batch_data = '\n'.join(','.join(str(row.get(field, '')) for field in self.fieldnames) for row in self.batch) + '\n'
-        encoded_data = batch_data.encode()
-        if self.mmap_file.tell() + len(encoded_data) > self.mmap_size:
-            self._resize_mmap_file()
-        self.mmap_file.write(encoded_data)
+        if self.index_writer:
+            encoded_data, row_offsets = self._encode_batch_with_offsets()
+        else:
+            self.row_writer.writerows(self._row_values(row) for row in self.batch)
+            encoded_data = self._take_encoded()
+        if self.index_writer:
+            # The writer thread appends batches in order, so file offsets are known up front
+            for row, row_offset in zip(self.batch, row_offsets):
+                self.index_writer.add(row, self.write_offset + row_offset)
+        self.writer.put(encoded_data)
+        self.write_offset += len(encoded_data)
         self.total_rows_written += len(self.batch)
         self.batch.clear()
 
-    def _resize_mmap_file(self):
-        self.mmap_size *= 2
+    def _encode_batch_with_offsets(self):
+        # Rows are encoded one at a time so each row's byte offset is known for the index
+        offset = 0
+        lines = []
+        row_offsets = []
+        for row in self.batch:
+            self.row_writer.writerow(self._row_values(row))
+            line = self._take_encoded()
+            row_offsets.append(offset)
+            offset += len(line)
+            lines.append(line)
+        return b''.join(lines), row_offsets
+
+    def _row_values(self, row: Dict) -> List[str]:
+        return [str(row.get(field, '')) for field in self.fieldnames]
+
+    def _take_encoded(self) -> bytes:
+        data = self.row_buffer.getvalue().encode()
+        self.row_buffer.seek(0)
+        self.row_buffer.truncate()
+        return data
+
+    def _write_encoded(self, encoded_data: bytes):
+        # Runs on the writer thread
+        if self.mmap_file.tell() + len(encoded_data) > self.mmap_size:
+            self._resize_mmap_file(self.mmap_file.tell() + len(encoded_data))
+        self.mmap_file.write(encoded_data)
+
+    def _flush_mmap_file(self):
+        self.mmap_file.flush()
+
+    def _resize_mmap_file(self, required_size: int):
+        position = self.mmap_file.tell()
+        while self.mmap_size < required_size:
+            self.mmap_size *= 2
         self.mmap_file.close()
-        with open(self.output_file, 'ab') as f:
-            f.write(b'\0' * self.mmap_size)
+        with open(self.output_file, 'r+b') as f:
+            f.truncate(self.mmap_size)
         self.mmap_file = mmap.mmap(os.open(self.output_file, os.O_RDWR), self.mmap_size)
-        self.mmap_file.seek(0, 2)  # Move to the end of the file
+        self.mmap_file.seek(position)
 
     def process_batch(self, items: List[Dict]):
         for item in items:
@@ -100,9 +154,12 @@ class TocMrfMetadataProcessor:
     def finalize(self):
         if self.batch:
             self._write_batch()
+        if self.writer:
+            self.writer.close()
         if self.mmap_file:
-            self.mmap_file.flush()
             self.mmap_file.close()
+        if self.index_writer:
+            self.index_writer.finalize()
         logger.info(f"Processed and wrote {self.total_rows_written} rows of toc_mrf_metadata to {self.output_file}")
 
 def process_and_write_toc_mrf_metadata(output_file: str, carrier: str):
@@ -1,26 +1,31 @@
 import csv
-import requests
 from datetime import datetime
 from urllib.parse import urlparse, parse_qs
 from typing import Dict, List
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 import os
+import threading
 from contextlib import contextmanager
 import mmap
+from async_writer import AsyncTableWriter
+import config
 
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
+_size_probe = None
+_size_probe_lock = threading.Lock()
+
 def get_file_size(url):
-    try:
-        response = requests.head(url, allow_redirects=True, timeout=5)
-        if 'Content-Length' in response.headers:
-            return int(response.headers['Content-Length']), ''
-        else:
-            return None, 'Content-Length not available in headers'
-    except requests.RequestException as e:
-        return None, f"Error: {str(e)}"
+    global _size_probe
+    # One shared probe, so concurrent callers share the per-host limits;
+    # requests is only imported once sizes are actually probed
+    with _size_probe_lock:
+        if _size_probe is None:
+            from size_probe import SizeProbe
+            _size_probe = SizeProbe(host_timeouts=config.SIZE_PROBE_HOST_TIMEOUTS)
+    return _size_probe.probe(url)
 
 def extract_filename_from_url(url):
     parsed_url = urlparse(url)
@@ -40,6 +45,7 @@ class TocMrfSizeProcessor:
         self.total_rows_written = 0
         self.executor = ThreadPoolExecutor(max_workers=50)
         self.mmap_file = None
+        self.writer = None
         self.mmap_size = 1024 * 1024 * 1024  # 1GB initial size
 
     def __enter__(self):
@@ -54,6 +60,8 @@ class TocMrfSizeProcessor:
             f.write(b'\0' * self.mmap_size)
         self.mmap_file = mmap.mmap(os.open(self.output_file, os.O_RDWR), self.mmap_size)
         self._write_header()
+        self.writer = AsyncTableWriter(self._write_encoded, self._flush_mmap_file,
+                                       name=f"writer-{os.path.basename(self.output_file)}")
 
     def _write_header(self):
         header = ','.join(self.fieldnames) + '\n'
@@ -62,19 +70,28 @@ class TocMrfSizeProcessor:
     def _write_batch(self):
         batch_data = '\n'.join(','.join(str(row.get(field, '')) for field in self.fieldnames) for row in self.batch) + '\n'
         encoded_data = batch_data.encode()
-        if self.mmap_file.tell() + len(encoded_data) > self.mmap_size:
-            self._resize_mmap_file()
-        self.mmap_file.write(encoded_data)
+        self.writer.put(encoded_data)
         self.total_rows_written += len(self.batch)
         self.batch.clear()
 
-    def _resize_mmap_file(self):
-        self.mmap_size *= 2
+    def _write_encoded(self, encoded_data: bytes):
+        # Runs on the writer thread
+        if self.mmap_file.tell() + len(encoded_data) > self.mmap_size:
+            self._resize_mmap_file(self.mmap_file.tell() + len(encoded_data))
+        self.mmap_file.write(encoded_data)
+
+    def _flush_mmap_file(self):
+        self.mmap_file.flush()
+
+    def _resize_mmap_file(self, required_size: int):
+        position = self.mmap_file.tell()
+        while self.mmap_size < required_size:
+            self.mmap_size *= 2
         self.mmap_file.close()
-        with open(self.output_file, 'ab') as f:
-            f.write(b'\0' * self.mmap_size)
+        with open(self.output_file, 'r+b') as f:
+            f.truncate(self.mmap_size)
         self.mmap_file = mmap.mmap(os.open(self.output_file, os.O_RDWR), self.mmap_size)
-        self.mmap_file.seek(0, 2)  # Move to the end of the file
+        self.mmap_file.seek(position)
 
     def process_batch(self, items: List[Dict]):
         futures = []
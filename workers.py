@@ -0,0 +1,50 @@
+import sys
+import logging
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+import config
+
+logger = logging.getLogger(__name__)
+
+def make_process_pool(max_workers: Optional[int] = None, preload: Optional[List[str]] = None) -> ProcessPoolExecutor:
+    """
+    Create a process pool whose workers start from a forkserver.
+
+    The forkserver imports the preload modules once and forks each worker from
+    that state, so workers neither re-import them nor inherit the parent's heavy
+    CLI imports (Selenium, tqdm). Platforms without forkserver use the default
+    start method.
+    """
+    if sys.platform == 'win32' or 'forkserver' not in mp.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers=max_workers)
+    context = mp.get_context('forkserver')
+    if preload:
+        context.set_forkserver_preload(preload)
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+def process_single_file(json_file: str) -> None:
+    """
+    Process a single JSON file and write the extracted data to CSV files.
+
+    Args:
+        json_file (str): Path to the JSON file to process.
+    """
+    import ijson
+    from toc_metadata_processor import process_and_write_toc_metadata
+    from toc_mrf_metadata_processor import process_and_write_toc_mrf_metadata
+    from toc_mrf_size_processor import process_and_write_toc_mrf_size_data
+
+    logging.info(f"Processing file: {json_file}")
+    try:
+        process_and_write_toc_metadata(json_file, config.TOC_METADATA_CSV)
+        process_and_write_toc_mrf_metadata(json_file, config.TOC_MRF_METADATA_CSV)
+        process_and_write_toc_mrf_size_data(json_file, config.TOC_MRF_SIZE_DATA_CSV)
+    except ijson.JSONError:
+        logging.error(f"Invalid JSON in file: {json_file}")
+    except Exception as e:
+        logging.error(f"Error processing file {json_file}: {str(e)}")
+
+# Modules the forkserver imports once for process_single_file workers
+PARSE_WORKER_PRELOAD = ['workers', 'ijson', 'toc_metadata_processor', 'toc_mrf_metadata_processor',
+                        'toc_mrf_size_processor']